@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the page filter on data/ocr_json.
+
+Times the original three-pass is_garbage + ten-regex is_new_form against
+filter_pages.classify_pages, checks that both give the same verdicts, and
+reports pages/sec and MB/sec. JSON parsing is done up front and not timed.
+
+  python bench_filter.py --repeat 3
+"""
+import re
+import json
+import time
+import argparse
+import filter_pages
+
+
+def legacy_is_garbage(text):
+    t = text.strip()
+    if len(t) < filter_pages.MIN_LEN:
+        return True
+    alpha = sum(1 for c in t if c.isalpha()) / max(len(t), 1)
+    if alpha < filter_pages.ALPHA_RATIO:
+        return True
+    toks = t.split()
+    if toks:
+        single = sum(1 for tok in toks if len(tok) == 1) / len(toks)
+        if single > filter_pages.SINGLE_CHAR_RATIO:
+            return True
+    return False
+
+
+def legacy_is_new_form(text):
+    h = text.strip()[:400].lower()
+    for p in filter_pages.FORM_PATTERNS:
+        if re.search(p, h):
+            return True
+    return False
+
+
+def legacy(docs):
+    return [[(legacy_is_garbage(p["text"]), legacy_is_new_form(p["text"])) for p in pages]
+            for pages in docs]
+
+
+def single_pass(docs):
+    return [[(c["garbage"], c["new_form"]) for c in filter_pages.classify_pages(pages)]
+            for pages in docs]
+
+
+def timed(fn, docs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(docs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the page filter")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    docs = [json.loads(f.read_text(encoding="utf-8")) for f in sorted(filter_pages.INPUT.glob("*.json"))]
+    pages = sum(len(d) for d in docs)
+    mb = sum(len(p["text"]) for d in docs for p in d) / 1e6
+    print(f"{len(docs)} documents, {pages} pages, {mb:.1f} M characters")
+
+    old_s, old = timed(legacy, docs, args.repeat)
+    new_s, new = timed(single_pass, docs, args.repeat)
+
+    for name, secs in (("legacy", old_s), ("single-pass", new_s)):
+        print(f"{name:<12} {secs:7.3f}s  {pages / secs:9.0f} pages/s  {mb / secs:6.1f} MB/s")
+    print(f"speedup: {old_s / new_s:.2f}x, verdicts identical: {old == new}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare the OCR image pipelines on data/original_pdfs.
+
+  legacy   RGB render at 2x, convert("L"), binarize with a Python lambda
+  adaptive grayscale render at a DPI chosen from the page size, LUT binarize
+  otsu     adaptive render with a per-page Otsu threshold
+
+Each pipeline can be run against each OCR backend (pytesseract CLI vs the
+persistent tesserocr engine). Reports render time, pages/sec and OCR character
+yield per pipeline/backend. The OCR cache is not used so every page really
+goes through tesseract.
+
+  python bench_ocr.py --max-pages 40 --backends pytesseract tesserocr
+"""
+import time
+import argparse
+import fitz
+from PIL import Image
+import ocr
+
+
+def render_legacy(page):
+    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    img = img.convert("L")
+    img = img.point(lambda x: 0 if x < 140 else 255)
+    return pix, img
+
+
+PIPELINES = {
+    "legacy": render_legacy,
+    "adaptive": lambda page: ocr.render_page(page, ocr.THRESHOLD),
+    "otsu": lambda page: ocr.render_page(page, "otsu"),
+}
+
+
+def iter_pages(max_pages, all_pages):
+    # by default only the pages the pipeline would actually OCR
+    seen = 0
+    for pdf in sorted(ocr.input_dir.glob("*.pdf")):
+        with fitz.open(pdf) as doc:
+            for page in doc:
+                if not all_pages and len(page.get_text("text").strip()) >= 50:
+                    continue
+                yield page
+                seen += 1
+                if seen >= max_pages:
+                    return
+
+
+def run(name, render, backend, max_pages, all_pages):
+    pages = 0
+    chars = 0
+    render_s = 0.0
+    pixel_bytes = 0
+    start = time.perf_counter()
+
+    for page in iter_pages(max_pages, all_pages):
+        t = time.perf_counter()
+        pix, img = render(page)
+        render_s += time.perf_counter() - t
+        pixel_bytes = max(pixel_bytes, len(pix.samples))
+
+        text = backend.image_to_string(img)
+        chars += sum(1 for c in text if not c.isspace())
+        pages += 1
+
+    elapsed = time.perf_counter() - start
+    return {
+        "pipeline": name,
+        "backend": backend.name,
+        "pages": pages,
+        "pages_per_sec": pages / elapsed if elapsed else 0.0,
+        "render_ms": 1000 * render_s / max(pages, 1),
+        "peak_pixmap_mb": pixel_bytes / 1e6,
+        "chars": chars,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark OCR image pipelines")
+    parser.add_argument("--max-pages", type=int, default=40)
+    parser.add_argument("--all-pages", action="store_true",
+                        help="also OCR pages that have a usable text layer")
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES), choices=list(PIPELINES))
+    parser.add_argument("--backends", nargs="+", default=["pytesseract"], choices=list(ocr.BACKENDS))
+    args = parser.parse_args()
+
+    results = []
+    for backend_name in args.backends:
+        backend = ocr.make_backend(backend_name)
+        for name in args.pipelines:
+            results.append(run(name, PIPELINES[name], backend, args.max_pages, args.all_pages))
+        backend.close()
+
+    print(f"{'pipeline':<10} {'backend':<12} {'pages':>6} {'pages/s':>8} {'render ms':>10} "
+          f"{'pixmap MB':>10} {'chars':>9}")
+    for r in results:
+        print(f"{r['pipeline']:<10} {r['backend']:<12} {r['pages']:>6} {r['pages_per_sec']:>8.2f} "
+              f"{r['render_ms']:>10.1f} {r['peak_pixmap_mb']:>10.1f} {r['chars']:>9}")
+
+
+if __name__ == "__main__":
+    main()
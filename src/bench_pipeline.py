@@ -0,0 +1,211 @@
+"""
+End-to-end benchmark of the pipeline stages on a synthetic corpus.
+
+Each stage runs in a fresh process over a corpus from synthetic_corpus.py,
+so its peak RSS is its own:
+
+  filter    filter_pages: classify and segment the OCR pages
+  clean     llm_clean_extraction: clean and reconcile each well locally (no LLM)
+  load      sql_db: bulk load the final outputs into a scratch database
+  geojson   build_geojson: read the scratch database back into GeoJSON
+
+Stage outputs go to <corpus>/bench/, never to data/ or www/. The load and
+geojson stages use the database BENCH_DB on the server db.py points at;
+geojson reads what load wrote, so on its own it needs an earlier load.
+
+Results are compared with the baseline stored for the same corpus size;
+a stage whose throughput drops, or whose peak RSS grows, by more than
+--tolerance is a regression and the exit status is 1.
+
+  python synthetic_corpus.py --wells 10000 --workers 0
+  python bench_pipeline.py --save-baseline      # on the reference commit
+  python bench_pipeline.py                      # after a change
+  python bench_pipeline.py --stages filter clean
+"""
+import os
+import sys
+import json
+import time
+import resource
+import contextlib
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+base = Path(__file__).resolve().parent.parent
+CORPUS = base / "data" / "synthetic"
+BASELINE = base / "data" / "bench_baseline.json"
+
+BENCH_DB = "oil_wells_bench_pipeline"
+STAGES = ["filter", "clean", "load", "geojson"]
+TOLERANCE = 0.10  # relative slowdown or memory growth that counts as a regression
+
+
+# -----------------------------
+# Stages (each returns the number of items it processed)
+# -----------------------------
+
+def run_filter(corpus, out):
+    import filter_pages
+
+    pages_seen = 0
+    # the per-segment report is not part of what is measured
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for path in sorted((corpus / "ocr_json").glob("*.json")):
+            pages_seen += filter_pages.process_file(path, force=True, out_dir=out)
+    return pages_seen
+
+
+def run_clean(corpus, out):
+    import llm_clean_extraction
+
+    files = sorted((corpus / "structured").glob("*.json"))
+    for path in files:
+        llm_clean_extraction.process_file(path, out, use_llm=False)
+    return len(files)
+
+
+def use_bench_database():
+    # db reads DB_NAME once, at import; this runs in the stage's own process
+    os.environ["DB_NAME"] = BENCH_DB
+
+
+def run_load(corpus, out):
+    use_bench_database()
+    import sql_db
+
+    sql_db.create_database(rebuild=True)
+    sql_db.create_tables()
+    sql_db.insert_well_data(incremental=False, data_folder=corpus / "final_outputs")
+    return len(list((corpus / "final_outputs").glob("*.json")))
+
+
+def run_geojson(corpus, out):
+    use_bench_database()
+    import build_geojson
+
+    out_file = out / "wells.geojson"
+    build_geojson.build_geojson(out_file=out_file)
+    with out_file.open(encoding="utf-8") as f:
+        return len(json.load(f)["features"])
+
+
+def bench_database_loaded():
+    """Whether an earlier load stage left wells in BENCH_DB (checked before geojson runs on its own)."""
+    use_bench_database()
+    import db
+
+    connection = db.server_connection()
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = %s AND table_name = 'wells'
+    """, (BENCH_DB,))
+    found = cursor.fetchone()[0] > 0
+    if found:
+        cursor.execute(f"SELECT COUNT(*) FROM `{BENCH_DB}`.wells")
+        found = cursor.fetchone()[0] > 0
+    cursor.close()
+    connection.close()
+    return found
+
+
+RUNNERS = {"filter": run_filter, "clean": run_clean, "load": run_load, "geojson": run_geojson}
+UNITS = {"filter": "pages", "clean": "wells", "load": "wells", "geojson": "wells"}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_stage(stage, corpus):
+    out = corpus / "bench" / stage
+    out.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    items = RUNNERS[stage](corpus, out)
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3), "items": items, "per_sec": round(items / seconds, 1),
+            "peak_mb": round(peak_rss_mb(), 1)}
+
+
+def measure(stage, corpus):
+    # a fresh interpreter per stage, so peak RSS is not carried over from the previous one
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_stage, stage, corpus).result()
+
+
+# -----------------------------
+# Baseline
+# -----------------------------
+
+def load_baselines(path):
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def regressions(stage, result, baseline, tolerance):
+    found = []
+    if result["per_sec"] < baseline["per_sec"] * (1 - tolerance):
+        found.append(f"throughput {result['per_sec']:.0f} vs {baseline['per_sec']:.0f} {UNITS[stage]}/s")
+    if result["peak_mb"] > baseline["peak_mb"] * (1 + tolerance):
+        found.append(f"peak RSS {result['peak_mb']:.0f} vs {baseline['peak_mb']:.0f} MB")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the pipeline stages on a synthetic corpus")
+    parser.add_argument("--corpus", type=Path, default=CORPUS, help="output of synthetic_corpus.py")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    corpus_file = args.corpus / "corpus.json"
+    if not corpus_file.exists():
+        print("no synthetic corpus in", args.corpus, "- run synthetic_corpus.py first")
+        sys.exit(2)
+    with corpus_file.open(encoding="utf-8") as f:
+        corpus = json.load(f)
+    key = f"{corpus['wells']} wells x {corpus['pages_per_well']} pages, seed {corpus['seed']}"
+    print(f"corpus: {corpus['wells']} wells, {corpus['pages']} pages, seed {corpus['seed']}")
+
+    if "geojson" in args.stages and "load" not in args.stages and not bench_database_loaded():
+        print(f"the geojson stage reads {BENCH_DB}, which has no wells yet - run with --stages load geojson")
+        sys.exit(2)
+
+    baselines = load_baselines(args.baseline)
+    stored = baselines.get(key, {})
+    results, failed = {}, []
+
+    print(f"\n{'stage':<8} {'seconds':>9} {'items':>9} {'per sec':>11} {'peak MB':>9}  vs baseline")
+    for stage in args.stages:
+        result = results[stage] = measure(stage, args.corpus)
+        if stage in stored:
+            found = regressions(stage, result, stored[stage], args.tolerance)
+            change = result["per_sec"] / stored[stage]["per_sec"] - 1
+            note = f"{change:+.0%} throughput" + (f"  REGRESSION: {'; '.join(found)}" if found else "")
+            if found:
+                failed.append(stage)
+        else:
+            note = "no baseline"
+        print(f"{stage:<8} {result['seconds']:9.2f} {result['items']:9d} "
+              f"{result['per_sec']:8.0f}/{UNITS[stage][0]} {result['peak_mb']:9.1f}  {note}")
+
+    if args.save_baseline:
+        baselines[key] = {**stored, **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baselines, indent=2), encoding="utf-8")
+        print(f"\nbaseline saved to {args.baseline}")
+    elif failed:
+        print(f"\n{len(failed)} stage(s) regressed beyond {args.tolerance:.0%}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Query benchmark for the schema migrations on synthetic wells.
+
+Loads --wells synthetic wells (synthetic_corpus.synthetic_well) into a scratch
+database with the version 0 schema, and times the read paths in their
+pre-migration form. Then it applies migrations.MIGRATIONS, timing each
+one, and times the same reads using the new indexes and columns. Both
+forms of a query must return the same number of rows.
+
+Needs a scratch MySQL 8 server (see bench_sql.py):
+
+  python bench_queries.py --user root --wells 1000000
+"""
+import time
+import random
+import argparse
+import mysql.connector
+import db
+import migrations
+import sql_db
+import synthetic_corpus
+
+BENCH_DB = "oil_wells_bench_queries"
+LOAD_CHUNK = 10000  # wells generated and inserted at a time
+
+BASE_EVENT_SQL = f"""
+    INSERT INTO stimulation_events (
+        id, api_number, {", ".join(sql_db.EVENT_COLUMNS)}
+    ) VALUES ({", ".join(["%s"] * (len(sql_db.EVENT_COLUMNS) + 2))})
+"""
+
+BBOX = (47.6, -103.6, 48.0, -103.0)  # south, west, north, east
+BBOX_WKT = (f"POLYGON(({BBOX[1]} {BBOX[0]}, {BBOX[3]} {BBOX[0]}, {BBOX[3]} {BBOX[2]}, "
+            f"{BBOX[1]} {BBOX[2]}, {BBOX[1]} {BBOX[0]}))")
+
+# (name, before migrations, after migrations, params). The map's reads by
+# (api_number, id) and (stimulation_event_id, id) are not here: they use the
+# foreign key indexes both before and after (migration 4 drops the composite
+# indexes migration 1 added for them)
+QUERIES = [
+    ("wells by county and operator",
+     "SELECT api_number FROM wells WHERE county = %s AND operator = %s",
+     "SELECT api_number FROM wells WHERE county = %s AND operator = %s",
+     ("Dunn", "XTO ENERGY INC.")),
+    ("events in one month",
+     "SELECT id FROM stimulation_events WHERE STR_TO_DATE(date_stimulated, '%%m/%%d/%%Y') BETWEEN %s AND %s",
+     "SELECT id FROM stimulation_events WHERE stimulated_on BETWEEN %s AND %s",
+     ("2014-03-01", "2014-03-31")),
+    ("Bakken jobs in one month",
+     "SELECT id FROM stimulation_events WHERE formation = %s "
+     "AND STR_TO_DATE(date_stimulated, '%%m/%%d/%%Y') BETWEEN %s AND %s",
+     "SELECT id FROM stimulation_events WHERE formation = %s AND stimulated_on BETWEEN %s AND %s",
+     ("Bakken", "2014-03-01", "2014-03-31")),
+    ("wells in a bounding box",
+     "SELECT api_number FROM wells WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s",
+     "SELECT api_number FROM wells WHERE MBRContains(ST_GeomFromText(%s, 4326, 'axis-order=long-lat'), location)",
+     None),
+]
+
+
+def query_params(params, after):
+    if params is not None:
+        return params
+    # the bounding box is passed as numbers before and as a polygon after
+    return (BBOX_WKT,) if after else (BBOX[0], BBOX[2], BBOX[1], BBOX[3])
+
+
+def load(connection, count):
+    cursor = connection.cursor()
+    rng = random.Random(0)
+    next_id = 1
+    start = time.perf_counter()
+
+    for first in range(0, count, LOAD_CHUNK):
+        wells = [synthetic_corpus.synthetic_well(i, rng) for i in range(first, min(first + LOAD_CHUNK, count))]
+        well_rows, event_rows, proppant_rows = [], [], []
+        for well in wells:
+            well_rows.append(sql_db.well_row(well))
+            for event in well["stimulation_events"]:
+                event_rows.append((next_id, well["api_number"]) + tuple(event.get(c) for c in sql_db.EVENT_COLUMNS))
+                for detail in event["proppant_breakdown"]:
+                    proppant_rows.append((next_id, detail["type"], detail["volume"]))
+                next_id += 1
+        sql_db.insert_rows(cursor, sql_db.WELL_SQL, well_rows, sql_db.BATCH_SIZE)
+        sql_db.insert_rows(cursor, BASE_EVENT_SQL, event_rows, sql_db.BATCH_SIZE)
+        sql_db.insert_rows(cursor, sql_db.PROPPANT_SQL, proppant_rows, sql_db.BATCH_SIZE)
+        connection.commit()
+        print(f"\r  loaded {min(first + LOAD_CHUNK, count)} wells", end="", flush=True)
+
+    cursor.close()
+    print(f"\n  {count} wells, {next_id - 1} events in {time.perf_counter() - start:.0f}s")
+
+
+def run_queries(connection, after, repeat):
+    results = {}
+    cursor = connection.cursor()
+    for name, before_sql, after_sql, params in QUERIES:
+        sql = after_sql if after else before_sql
+        best, rows = None, 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql, query_params(params, after))
+            rows = len(cursor.fetchall())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, rows)
+    cursor.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark read queries before and after the schema migrations")
+    parser.add_argument("--host", default=db.DB_HOST)
+    parser.add_argument("--port", type=int, default=db.DB_PORT)
+    parser.add_argument("--user", default=db.DB_USER)
+    parser.add_argument("--password", default=db.DB_PASSWORD)
+    parser.add_argument("--wells", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    connection = mysql.connector.connect(host=args.host, port=args.port, user=args.user, password=args.password)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    cursor.execute(f"CREATE DATABASE {BENCH_DB}")
+    cursor.execute(f"USE {BENCH_DB}")
+    for statement in sql_db.TABLES:
+        cursor.execute(statement)
+    connection.commit()
+    cursor.close()
+
+    print("Loading synthetic wells")
+    load(connection, args.wells)
+
+    before = run_queries(connection, after=False, repeat=args.repeat)
+
+    for migration in migrations.MIGRATIONS:
+        start = time.perf_counter()
+        migrations.migrate(connection, target=migration["version"])
+        print(f"  migration {migration['version']} took {time.perf_counter() - start:.1f}s")
+
+    after = run_queries(connection, after=True, repeat=args.repeat)
+    connection.close()
+
+    print(f"\n{'query':<30} {'before':>10} {'after':>10} {'speedup':>8}  rows")
+    for name, _, _, _ in QUERIES:
+        (old_s, old_rows), (new_s, new_rows) = before[name], after[name]
+        check = "" if old_rows == new_rows else f"  MISMATCH ({old_rows} before)"
+        print(f"{name:<30} {old_s * 1000:9.1f}ms {new_s * 1000:9.1f}ms {old_s / new_s:7.1f}x  {new_rows}{check}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark of the MySQL loader on synthetic wells.
+
+Loads the same generated wells row by row (the old insert_well_data path)
+and with sql_db.bulk_load_wells, each into a freshly created database, and
+reports wells/sec and rows/sec. The row-by-row run is kept small; its rate
+is extrapolated to the full size.
+
+Needs a scratch MySQL 8 server (the migrations do not run on MariaDB), e.g.
+
+  docker run -d --name bench-mysql -e MYSQL_ALLOW_EMPTY_PASSWORD=yes -p 3306:3306 mysql:8
+  python bench_sql.py --user root --wells 200000
+"""
+import time
+import random
+import argparse
+import mysql.connector
+import sql_db
+import db
+import migrations
+from synthetic_corpus import synthetic_well
+
+BENCH_DB = "oil_wells_bench"
+
+
+def synthetic_wells(count, seed=0):
+    rng = random.Random(seed)
+    return [synthetic_well(i, rng) for i in range(count)]
+
+
+def fresh_database(args):
+    connection = mysql.connector.connect(host=args.host, port=args.port, user=args.user, password=args.password)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    cursor.execute(f"CREATE DATABASE {BENCH_DB}")
+    cursor.execute(f"USE {BENCH_DB}")
+    for statement in sql_db.TABLES:
+        cursor.execute(statement)
+    connection.commit()
+    cursor.close()
+    migrations.migrate(connection)
+    return connection
+
+
+def row_count(wells):
+    events = [e for w in wells for e in w["stimulation_events"]]
+    return len(wells) + len(events) + sum(len(e["proppant_breakdown"]) for e in events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark row-by-row vs bulk loading into MySQL")
+    parser.add_argument("--host", default=db.DB_HOST)
+    parser.add_argument("--port", type=int, default=db.DB_PORT)
+    parser.add_argument("--user", default=db.DB_USER)
+    parser.add_argument("--password", default=db.DB_PASSWORD)
+    parser.add_argument("--wells", type=int, default=100000, help="wells for the bulk load")
+    parser.add_argument("--row-by-row-wells", type=int, default=2000,
+                        help="wells for the row-by-row load, 0 to skip it")
+    parser.add_argument("--batch-size", type=int, default=sql_db.BATCH_SIZE)
+    parser.add_argument("--commit-wells", type=int, default=sql_db.COMMIT_WELLS)
+    args = parser.parse_args()
+
+    wells = synthetic_wells(args.wells)
+    print(f"{len(wells)} synthetic wells, {row_count(wells)} rows")
+
+    results = []
+    if args.row_by_row_wells:
+        subset = wells[:args.row_by_row_wells]
+        connection = fresh_database(args)
+        start = time.perf_counter()
+        sql_db.insert_wells_row_by_row(connection, subset)
+        results.append(("row-by-row", len(subset), row_count(subset), time.perf_counter() - start))
+        connection.close()
+
+    connection = fresh_database(args)
+    start = time.perf_counter()
+    sql_db.bulk_load_wells(connection, wells, args.batch_size, args.commit_wells)
+    results.append(("bulk", len(wells), row_count(wells), time.perf_counter() - start))
+    connection.close()
+
+    for name, count, rows, secs in results:
+        print(f"{name:<11} {count:8d} wells {secs:8.2f}s  {count / secs:9.0f} wells/s  {rows / secs:9.0f} rows/s"
+              f"  (~{args.wells * secs / count / 60:.1f} min for {args.wells} wells)")
+    if len(results) == 2:
+        slow, fast = results[0], results[1]
+        print(f"speedup: {(fast[1] / fast[3]) / (slow[1] / slow[3]):.1f}x wells/s")
+
+
+if __name__ == "__main__":
+    main()
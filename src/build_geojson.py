@@ -1,22 +1,15 @@
 # export_geojson.py
 import json
 from pathlib import Path
-import mysql.connector
 from mysql.connector import Error
+import db
 
 OUT_DIR = Path(__file__).resolve().parent.parent / "www" / "data"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 OUT_FILE = OUT_DIR / "wells.geojson"
 
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "devuser",
-    "password": "",
-    "database": "oil_wells_db"
-}
-
 def fetch_wells():
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = db.connect()
     cursor = conn.cursor(dictionary=True)
 
     # Basic well info and one-to-many stimulation events joined later
@@ -72,7 +65,7 @@ def fetch_wells():
     return wells, events_by_api
 
 
-def build_geojson():
+def build_geojson(out_file=OUT_FILE):
     wells, events_by_api = fetch_wells()
     features = []
 
@@ -103,9 +96,9 @@ def build_geojson():
         features.append(feature)
 
     fc = {"type": "FeatureCollection", "features": features}
-    with OUT_FILE.open("w", encoding="utf-8") as f:
+    with out_file.open("w", encoding="utf-8") as f:
         json.dump(fc, f, indent=2, ensure_ascii=False)
-    print(f"Wrote {len(features)} features to {OUT_FILE}")
+    print(f"Wrote {len(features)} features to {out_file}")
 
 
 if __name__ == "__main__":
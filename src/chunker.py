@@ -0,0 +1,112 @@
+import json
+from rate_limit import estimate_tokens
+
+# -----------------------------
+# Request planning for LLM extraction
+#
+# Segments of one well are turned into chunks of at most `budget` tokens:
+#   - in batch mode, small segments are packed together into one request,
+#     answered with one record per segment; otherwise each goes out on its own
+#   - a segment over the budget is split at page boundaries (lines, if a single
+#     page is too big) and the records of its pieces are merged afterwards
+# A segment that fits on its own is sent exactly as before.
+# -----------------------------
+
+PAGE_SEPARATOR = "\n\n"
+
+
+def pack_text(items):
+    """Request text for [(segment_id, text)]; a lone segment goes out unlabelled, exactly as before."""
+    if len(items) == 1:
+        return items[0][1]
+    return PAGE_SEPARATOR.join(f"[segment {seg_id}]\n{text}" for seg_id, text in items)
+
+
+def split_text(text, budget):
+    """Split an oversized page at line boundaries (and long lines by length)."""
+    max_chars = budget * 4
+    pieces, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and estimate_tokens(current + line) > budget:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_pages(pages, budget):
+    """Group consecutive pages into pieces under the budget."""
+    pieces, current = [], []
+    for page in pages:
+        if estimate_tokens(page) > budget:
+            if current:
+                pieces.append(PAGE_SEPARATOR.join(current))
+                current = []
+            pieces.extend(split_text(page, budget))
+            continue
+        if current and estimate_tokens(PAGE_SEPARATOR.join(current + [page])) > budget:
+            pieces.append(PAGE_SEPARATOR.join(current))
+            current = []
+        current.append(page)
+    if current:
+        pieces.append(PAGE_SEPARATOR.join(current))
+    return pieces
+
+
+def plan_chunks(segments, budget, max_segments=1):
+    """
+    segments: [(segment_id, [page texts])] in document order.
+    Returns [{"segment_ids": [...], "texts": [...]}]; each text is one request,
+    several texts mean one segment split into pieces. With max_segments > 1,
+    up to that many small segments are packed into one chunk, which also
+    carries "parts": [(segment_id, text)] and must be sent with the batch
+    prompt so each segment keeps its own record.
+    """
+    chunks, packed = [], []
+
+    def flush():
+        if len(packed) == 1:
+            chunks.append({"segment_ids": [packed[0][0]], "texts": [packed[0][1]]})
+        elif packed:
+            chunks.append({"segment_ids": [seg_id for seg_id, _ in packed], "texts": [pack_text(packed)],
+                           "parts": list(packed)})
+        packed.clear()
+
+    for seg_id, pages in segments:
+        text = PAGE_SEPARATOR.join(pages)
+        if estimate_tokens(text) > budget:
+            flush()
+            chunks.append({"segment_ids": [seg_id], "texts": split_pages(pages, budget)})
+            continue
+        if packed and (len(packed) == max_segments
+                       or estimate_tokens(pack_text(packed + [(seg_id, text)])) > budget):
+            flush()
+        packed.append((seg_id, text))
+    flush()
+    return chunks
+
+
+def merge_records(records):
+    """One record from the pieces of a split segment: first value per field, all distinct events."""
+    merged = {}
+    events, seen = [], set()
+    for record in records:
+        for key, value in record.items():
+            if key == "stimulation_events":
+                for event in value or []:
+                    fingerprint = json.dumps(event, sort_keys=True)
+                    if fingerprint not in seen:
+                        seen.add(fingerprint)
+                        events.append(event)
+            elif merged.get(key) is None:
+                merged[key] = value
+    merged["stimulation_events"] = events
+    return merged
@@ -0,0 +1,50 @@
+import os
+import mysql.connector
+from mysql.connector import pooling
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -----------------------------
+# Shared MySQL access for sql_db, webscraper_v2 and build_geojson
+#
+# Settings come from the environment or .env; the defaults are the values the
+# scripts used to hardcode. connect() hands out connections from one pool per
+# process, and connection.close() returns them to it instead of hanging up.
+# -----------------------------
+
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+DB_USER = os.getenv("DB_USER", "devuser")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "")
+DB_NAME = os.getenv("DB_NAME", "oil_wells_db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+_pool = None
+
+
+def server_config():
+    return {"host": DB_HOST, "port": DB_PORT, "user": DB_USER, "password": DB_PASSWORD}
+
+
+def server_connection():
+    """A plain connection without a default database, for CREATE/DROP DATABASE."""
+    return mysql.connector.connect(**server_config())
+
+
+def get_pool():
+    # created on first use, so the database can be created before anything connects to it
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(
+            pool_name="oil_wells",
+            pool_size=DB_POOL_SIZE,
+            database=DB_NAME,
+            **server_config()
+        )
+    return _pool
+
+
+def connect():
+    """A pooled connection to DB_NAME; close() gives it back to the pool."""
+    return get_pool().get_connection()
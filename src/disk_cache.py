@@ -0,0 +1,144 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+EVICT_EVERY = 64  # puts between size checks
+
+
+def make_key(*parts):
+    """Content hash of the given str/bytes/number parts."""
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if not isinstance(part, (bytes, bytearray, memoryview)):
+            part = str(part).encode("utf-8")
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """
+    Small SQLite-backed key/value cache with size-bounded LRU eviction.
+
+    Safe to share between processes and threads: each process/thread opens
+    its own connection (WAL mode) the first time it touches the cache.
+    Connections of threads that have exited (a finished pool's workers) are
+    closed whenever a new one is opened, so at most one per live thread stays
+    open. close() closes the rest; a thread that uses the cache afterwards
+    opens a new one.
+    """
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, ttl=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []  # (pid, thread, connection) for every thread, so they can be closed
+        self._generation = 0  # bumped by close(), invalidating the thread-local connections
+
+    def _db(self):
+        local = self._local
+        if (getattr(local, "conn", None) is None or local.pid != os.getpid()
+                or local.generation != self._generation):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # closed from whichever thread calls close(), hence check_same_thread=False;
+            # until then only the opening thread uses it
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    size INTEGER,
+                    created REAL,
+                    last_used REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+            local.conn = conn
+            local.pid = os.getpid()
+            local.generation = self._generation
+            with self._lock:
+                dead = [c for c in self._conns if c[0] == local.pid and not c[1].is_alive()]
+                self._conns = [c for c in self._conns if c not in dead]
+                self._conns.append((local.pid, threading.current_thread(), conn))
+            for _, _, old in dead:
+                old.close()
+        return local.conn
+
+    def get(self, key):
+        db = self._db()
+        row = db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            row = None
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        self._db().execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode("utf-8")), now, now)
+        )
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        # drop least recently used entries until the cache fits in max_bytes
+        db = self._db()
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        rows = db.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        return len(doomed)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        if self._conns:
+            self.evict()
+        pid = os.getpid()
+        with self._lock:
+            # connections inherited from a parent process belong to it, leave them alone
+            mine = [conn for owner, _, conn in self._conns if owner == pid]
+            self._conns = []
+            self._generation += 1
+        for conn in mine:
+            conn.close()
+        self._local.conn = None
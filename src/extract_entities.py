@@ -1,10 +1,17 @@
-import json
 import os
+import json
 import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from google import genai
-from dotenv import load_dotenv
-import re
+from segment_store import SegmentReader
+from rate_limit import RateLimiter, retry_hint, estimate_tokens
+from header_rules import extract_header, has_stimulation_table
+from score_segments import load_relevance
+from chunker import plan_chunks, merge_records
+import llm_cache
+import llm_backend
 
 base = Path(__file__).resolve().parent.parent
 INPUT = base / "data" / "segments"
@@ -14,10 +21,20 @@ LOGS = base / "data" / "logs"
 OUTPUT.mkdir(parents=True, exist_ok=True)
 LOGS.mkdir(parents=True, exist_ok=True)
 
-load_dotenv()
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+MODEL = "gemma-3-27b-it"
+
+# requests in flight and the quota they share (gemma-3 free tier: 30 RPM, 15k TPM)
+WORKERS = 4
+REQUESTS_PER_MINUTE = 30
+TOKENS_PER_MINUTE = 15000
+
+# header-only segments the regex rules read at least this well skip the LLM
+RULE_CONFIDENCE = 0.95
 
-SECONDS_BETWEEN_CALLS = 2  # stay under rate limit
+# segment text per request: small segments are packed up to this, larger ones split
+CHUNK_TOKENS = 6000
+# packed segments per batched request, each answered separately
+BATCH_SIZE = 8
 
 
 SYSTEM_PROMPT = """
@@ -70,17 +87,20 @@ Rules:
 """
 
 
-def extract_segment(text, retries=3):
-    payload = SYSTEM_PROMPT + "\n\n" + text[:12000]
+BATCH_PROMPT = SYSTEM_PROMPT + """
+The input holds several segments, each starting with a line "[segment N]".
+Extract each segment on its own and return ONLY a JSON array with one object
+per segment: the schema above plus "segment_id": N.
+"""
+
 
+def call_model(payload, retries=3, limiter=None):
     for attempt in range(retries):
-        try:
-            resp = client.models.generate_content(
-                model="gemma-3-27b-it",
-                contents=payload
-            )
+        if limiter is not None:
+            limiter.acquire(estimate_tokens(payload))
 
-            raw = resp.text.strip()
+        try:
+            raw = llm_backend.generate(MODEL, payload).strip()
 
             # remove markdown if model wraps in ```json
             if raw.startswith("```"):
@@ -88,18 +108,110 @@ def extract_segment(text, retries=3):
                 if raw.startswith("json"):
                     raw = raw[4:]
 
-            return json.loads(raw)
+            json.loads(raw)  # only hand back (and cache) parseable output
+            if limiter is not None:
+                limiter.success()
+            return raw
 
         except Exception as e:
-            msg = str(e)
-            match = re.search(r"retry in (\d+\.?\d*)s", msg)
-            wait = float(match.group(1)) + 2 if match else 2 ** attempt
+            hint = retry_hint(e)
+            wait = hint + 2 if hint is not None else 2 ** attempt
             print(f"  rate limited, waiting {wait:.0f}s (attempt {attempt+1})")
-            time.sleep(wait)
+            if limiter is not None and hint is not None:
+                # hold every worker, not just this one, and slow the bucket down
+                limiter.pause(wait)
+            else:
+                time.sleep(wait)
 
     return None
 
 
+_stats_lock = threading.Lock()
+
+
+def count(stats, key):
+    if stats is not None:
+        with _stats_lock:
+            stats[key] = stats.get(key, 0) + 1
+
+
+def rule_answer(text, stats=None):
+    """The rule-based record for a plain header segment, or None if it needs the LLM."""
+    if has_stimulation_table(text):
+        return None
+    record, confidence = extract_header(text)
+    if confidence < RULE_CONFIDENCE:
+        return None
+    count(stats, "rules")
+    return record
+
+
+def extract_segment(text, retries=3, limiter=None, stats=None, use_rules=True):
+    if use_rules:
+        record = rule_answer(text, stats)
+        if record is not None:
+            return record
+    count(stats, "llm")
+
+    payload = SYSTEM_PROMPT + "\n\n" + text
+
+    raw = llm_cache.cached_response(MODEL, SYSTEM_PROMPT, text,
+                                    lambda: call_model(payload, retries, limiter))
+    return json.loads(raw) if raw is not None else None
+
+
+def extract_chunk(chunk, retries=3, limiter=None, stats=None):
+    """One request per text of a single-segment chunk; the pieces of a split segment are merged."""
+    records = []
+    for text in chunk["texts"]:
+        record = extract_segment(text, retries, limiter, stats, use_rules=False)
+        if not validate(record):
+            return None
+        records.append(record)
+    return records[0] if len(records) == 1 else merge_records(records)
+
+
+def extract_batch(chunk, retries=3, limiter=None, stats=None):
+    """
+    One request for the packed segments of a chunk, answered with a JSON array
+    keyed by segment_id. Elements that are missing or fail validate() are
+    extracted again with single-segment calls. Returns {segment_id: record}.
+    """
+    text = chunk["texts"][0]
+    count(stats, "llm")
+    count(stats, "batches")
+    raw = llm_cache.cached_response(MODEL, BATCH_PROMPT, text,
+                                    lambda: call_model(BATCH_PROMPT + "\n\n" + text, retries, limiter))
+
+    items = json.loads(raw) if raw is not None else []
+    records = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            seg_id = int(item.pop("segment_id", None))
+        except (TypeError, ValueError):
+            continue
+        if seg_id in chunk["segment_ids"] and validate(item):
+            records[seg_id] = item
+
+    for seg_id, seg_text in chunk["parts"]:
+        if seg_id not in records:
+            count(stats, "fallback")
+            records[seg_id] = extract_segment(seg_text, retries, limiter, stats, use_rules=False)
+    return records
+
+
+def prompt_tokens(text, prompt=SYSTEM_PROMPT):
+    return estimate_tokens(prompt + "\n\n" + text)
+
+
+def chunk_tokens(chunk):
+    """Tokens of the requests a chunk is sent as, with the prompt each actually uses."""
+    prompt = BATCH_PROMPT if "parts" in chunk else SYSTEM_PROMPT
+    return sum(prompt_tokens(text, prompt) for text in chunk["texts"])
+
+
 def validate(record):
     if not record:
         return False
@@ -121,59 +233,211 @@ def validate(record):
     return True
 
 
+# -----------------------------
+# Checkpoints: each result is appended to <well>_structured.jsonl as it lands;
+# the journal is folded into <well>_structured.json when the well is done.
+# -----------------------------
+
+def journal_path(output_path):
+    return output_path.with_suffix(".jsonl")
+
+
+def read_journal(path):
+    """
+    Entries of every complete line in the journal. A torn last line from a
+    crash is truncated away so appends stay valid.
+    """
+    entries = []
+    if not path.exists():
+        return entries
+
+    good = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+            good += len(line)
+
+    if good < path.stat().st_size:
+        with open(path, "r+b") as f:
+            f.truncate(good)
+
+    return entries
+
+
+def append_result(journal, entry):
+    journal.write(json.dumps(entry) + "\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+
+
+def compact_results(output_path, results):
+    """Write the sorted results as the usual indented JSON array, atomically, and drop the journal."""
+    tmp = output_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(sorted(results, key=lambda r: r["segment_id"]), indent=2), encoding="utf-8")
+    os.replace(tmp, output_path)
+    journal_path(output_path).unlink(missing_ok=True)
+
+
 def load_existing(output_path):
+    """Compacted results plus whatever the journal of an interrupted run holds."""
+    results = {}
     if output_path.exists():
-        return json.loads(output_path.read_text(encoding="utf-8"))
-    return []
+        results = {r["segment_id"]: r for r in json.loads(output_path.read_text(encoding="utf-8"))}
+    for entry in read_journal(journal_path(output_path)):
+        results[entry["segment_id"]] = entry
+    return list(results.values())
 
 
-def process_file(path):
+def process_file(path, limiter=None, workers=WORKERS, use_rules=True, use_relevance=True,
+                 batch_size=BATCH_SIZE):
+    """Extract the segments not saved yet. Returns how many failed validation."""
     well_id = path.stem.replace("_segments", "")
     output_path = OUTPUT / f"{well_id}_structured.json"
 
     segments = json.loads(path.read_text(encoding="utf-8"))
+    reader = SegmentReader()
+    if limiter is None:
+        limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
 
     results = load_existing(output_path)
-    done_ids = {r["segment_id"] for r in results}
+    # a packed chunk is saved once, under its first segment, and covers all of segment_ids
+    done_ids = {seg_id for r in results for seg_id in r.get("segment_ids", [r["segment_id"]])}
 
     print(f"\nProcessing {well_id} ({len(segments)} segments, {len(done_ids)} already done)")
 
-    for segment in segments:
-        seg_id = segment["segment_id"]
+    # scores from score_segments.py: irrelevant segments are dropped, the
+    # chunks with the best segments go out first
+    relevance = load_relevance(path) if use_relevance else None
+    irrelevant = 0
 
-        if seg_id in done_ids:
-            print(f"  skip segment {seg_id} (already saved)")
+    todo = []
+    for segment in segments:
+        if segment["segment_id"] in done_ids:
+            print(f"  skip segment {segment['segment_id']} (already saved)")
             continue
-
-        print(f"  extracting segment {seg_id}...", end=" ", flush=True)
-
-        extracted = extract_segment(segment["text"])
-
-        if validate(extracted):
-            results.append({
-                "segment_id": seg_id,
-                "data": extracted
-            })
-
-            output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
-            print("saved")
-        else:
-            print("validation failed")
-
-        time.sleep(SECONDS_BETWEEN_CALLS)
-
+        if relevance and not relevance[segment["segment_id"]]["relevant"]:
+            irrelevant += 1
+            continue
+        todo.append(segment)
+
+    failed = 0
+
+    def save(seg_ids, extracted):
+        nonlocal failed
+        label = "+".join(map(str, seg_ids))
+        if not validate(extracted):
+            print(f"  segment {label}: validation failed")
+            failed += len(seg_ids)
+            return
+        entry = {"segment_id": seg_ids[0], "data": extracted}
+        if len(seg_ids) > 1:
+            entry["segment_ids"] = seg_ids
+        results.append(entry)
+        append_result(journal, entry)
+        print(f"  segment {label}: saved")
+
+    journal = open(journal_path(output_path), "a", encoding="utf-8")
+
+    # header segments the rules can read are answered here, the rest is chunked
+    stats = {}
+    pending = []
+    before = {"tokens": 0, "requests": 0, "dropped_chars": 0}
+    for segment in todo:
+        pages = reader.pages(segment)
+        text = "\n\n".join(pages)
+        record = rule_answer(text, stats) if use_rules else None
+        if record is not None:
+            save([segment["segment_id"]], record)
+            continue
+        pending.append((segment["segment_id"], pages))
+        # what one truncated request per segment used to send
+        before["tokens"] += prompt_tokens(text[:12000])
+        before["requests"] += 1
+        before["dropped_chars"] += max(0, len(text) - 12000)
+
+    # segments are only packed for the batch prompt, which answers each one
+    # separately: reconcile_locally votes across the per-segment records
+    chunks = plan_chunks(pending, CHUNK_TOKENS, batch_size)
+    if relevance:
+        chunks.sort(key=lambda c: max(relevance[i]["score"] for i in c["segment_ids"]), reverse=True)
+
+    # up to `workers` requests in flight, paced by the shared limiter;
+    # results are written from this thread as each one lands
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for chunk in chunks:
+            if "parts" in chunk:
+                futures[pool.submit(extract_batch, chunk, limiter=limiter, stats=stats)] = None
+            else:
+                futures[pool.submit(extract_chunk, chunk, limiter=limiter, stats=stats)] = chunk["segment_ids"]
+
+        for fut in as_completed(futures):
+            if futures[fut] is None:
+                for seg_id, extracted in sorted(fut.result().items()):
+                    save([seg_id], extracted)
+            else:
+                save(futures[fut], fut.result())
+
+    reader.close()
+    journal.close()
+    if journal_path(output_path).stat().st_size:
+        compact_results(output_path, results)
+    else:
+        journal_path(output_path).unlink()
+
+    if irrelevant or todo:
+        bypassed = stats.get("rules", 0)
+        print(f"  {well_id}: {stats.get('llm', 0)} model calls, {irrelevant + bypassed} avoided "
+              f"({irrelevant} irrelevant, {bypassed}/{len(todo)} answered by rules)")
+    if stats.get("batches"):
+        print(f"  {well_id}: {stats['batches']} batched requests, "
+              f"{stats.get('fallback', 0)} segments retried one by one")
+    if pending:
+        after = sum(chunk_tokens(c) for c in chunks)
+        print(f"  {well_id}: ~{before['tokens']} tokens in {before['requests']} truncated requests "
+              f"({before['dropped_chars']} chars dropped) -> ~{after} tokens in "
+              f"{sum(len(c['texts']) for c in chunks)} chunked requests, nothing dropped")
+    if failed:
+        print(f"  {well_id}: {failed} segments failed, they are retried on the next run")
     print(f"done: {output_path.name}")
+    return failed
 
 
 def main():
+    parser = argparse.ArgumentParser(description="extract well data from segments with the LLM")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="requests in flight")
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE,
+                        help="requests per minute, 0 = unlimited")
+    parser.add_argument("--tpm", type=float, default=TOKENS_PER_MINUTE,
+                        help="input tokens per minute, 0 = unlimited")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    parser.add_argument("--no-rules", action="store_true", help="send header segments to the LLM too")
+    parser.add_argument("--no-relevance", action="store_true",
+                        help="ignore score_segments.py and extract every segment")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE,
+                        help="segments per batched request, 1 = one request per segment")
+    args = parser.parse_args()
+
+    llm_cache.open_cache(not args.no_cache)
+
     files = sorted(INPUT.glob("*_segments.json"))
 
     if not files:
         print("No segment files found.")
         return
 
+    # one limiter for the whole run so the quota is shared across wells
+    limiter = RateLimiter(args.rpm, args.tpm or None)
+
     for f in files:
-        process_file(f)
+        process_file(f, limiter, args.workers, not args.no_rules, not args.no_relevance, args.batch)
+
+    llm_cache.report()
 
     print("\nDone.")
 
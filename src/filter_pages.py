@@ -1,50 +1,85 @@
 import json
 import re
+import string
 from pathlib import Path
+from segment_store import load_source, compact_segment
 
 base = Path(__file__).resolve().parent.parent
 INPUT = base / "data" / "ocr_json"
 OUT = base / "data" / "segments"
-OUT.mkdir(parents=True, exist_ok=True)
 
 MIN_LEN = 150
 ALPHA_RATIO = 0.20
 SINGLE_CHAR_RATIO = 0.40
 
+FORM_PATTERNS = [
+    r"well name and number",
+    r"well file\s*(no|number|#)",
+    r"api\s*(no|number|#)?[\s:\-]*\d{2}",
+    r"sundry notices",
+    r"form\s*[468]\b",
+    r"sfn\s*\d{3,5}",
+    r"spill\s*(report|incident)",
+    r"certified survey",
+    r"north dakota industrial commission",
+    r"oil and gas division",
+]
+# one alternation, one scan of the header instead of ten
+FORM_RE = re.compile("|".join(f"(?:{p})" for p in FORM_PATTERNS))
+
+ASCII_LETTERS = string.ascii_letters.encode()
+ASCII_RUNS = re.compile(r"[\x00-\x7f]+")
+
+
+def _features(t):
+    # every count below runs in C: bytes.translate for ASCII letters, map over
+    # the (few) non-ASCII characters, map(len) over the tokens
+    length = len(t)
+    b = t.encode("ascii", "ignore")
+    alpha = len(b) - len(b.translate(None, ASCII_LETTERS))
+    if len(b) < length:
+        alpha += sum(map(str.isalpha, ASCII_RUNS.sub("", t)))
+    toks = t.split()
+    single = list(map(len, toks)).count(1) / len(toks) if toks else 0.0
+    return length, alpha / max(length, 1), single
+
+
+def page_features(text):
+    # (length, alphabetic ratio, single-character token ratio) of the stripped text
+    return _features(text.strip())
+
 
 def is_garbage(text):
-    t = text.strip()
-    if len(t) < MIN_LEN:
+    length, alpha, single = page_features(text)
+    if length < MIN_LEN:
         return True
-    alpha = sum(1 for c in t if c.isalpha()) / max(len(t), 1)
     if alpha < ALPHA_RATIO:
         return True
-    toks = t.split()
-    if toks:
-        single = sum(1 for tok in toks if len(tok) == 1) / len(toks)
-        if single > SINGLE_CHAR_RATIO:
-            return True
+    if single > SINGLE_CHAR_RATIO:
+        return True
     return False
 
 
 def is_new_form(text):
-    h = text.strip()[:400].lower()
-    patterns = [
-        r"well name and number",
-        r"well file\s*(no|number|#)",
-        r"api\s*(no|number|#)?[\s:\-]*\d{2}",
-        r"sundry notices",
-        r"form\s*[468]\b",
-        r"sfn\s*\d{3,5}",
-        r"spill\s*(report|incident)",
-        r"certified survey",
-        r"north dakota industrial commission",
-        r"oil and gas division",
-    ]
-    for p in patterns:
-        if re.search(p, h):
-            return True
-    return False
+    return FORM_RE.search(text.strip()[:400].lower()) is not None
+
+
+def classify_page(text):
+    # all page features and both verdicts from a single strip of the text
+    t = text.strip()
+    length, alpha, single = _features(t)
+    return {
+        "length": length,
+        "alpha_ratio": alpha,
+        "single_ratio": single,
+        "garbage": length < MIN_LEN or alpha < ALPHA_RATIO or single > SINGLE_CHAR_RATIO,
+        "new_form": FORM_RE.search(t[:400].lower()) is not None
+    }
+
+
+def classify_pages(pages):
+    """Score a whole document's pages in one call."""
+    return [classify_page(p["text"]) for p in pages]
 
 
 def make_segment(i, pages):
@@ -55,11 +90,14 @@ def make_segment(i, pages):
     }
 
 
-def segment_pages(pages):
+def segment_pages(pages, new_form=None):
+    # new_form: optional precomputed is_new_form flags, one per page
+    if new_form is None:
+        new_form = [is_new_form(p["text"]) for p in pages]
     segs = []
     cur = []
-    for p in pages:
-        if is_new_form(p["text"]) and cur:
+    for p, starts_form in zip(pages, new_form):
+        if starts_form and cur:
             segs.append(make_segment(len(segs) + 1, cur))
             cur = []
         cur.append(p)
@@ -68,24 +106,33 @@ def segment_pages(pages):
     return segs
 
 
-def process_file(path):
+def process_file(path, force=False, out_dir=OUT):
+    """Segment one OCR json into out_dir. Returns the number of pages read (0 if skipped)."""
     name = path.stem
-    outp = OUT / f"{name}_segments.json"
-    if outp.exists():
+    outp = out_dir / f"{name}_segments.json"
+    if outp.exists() and not force:
         print("skip:", name)
-        return
-    pages = json.loads(path.read_text(encoding="utf-8"))
+        return 0
+    pages, spans, digest = load_source(path)
+    spans_by_page = {p["page_number"]: span for p, span in zip(pages, spans)}
     total = len(pages)
-    clean = [p for p in pages if not is_garbage(p["text"])]
-    segs = segment_pages(clean)
+    scores = classify_pages(pages)
+    kept = [(p, c) for p, c in zip(pages, scores) if not c["garbage"]]
+    clean = [p for p, _ in kept]
+    segs = segment_pages(clean, [c["new_form"] for _, c in kept])
     print(f"\n{name}")
     print(f" pages: {total} -> kept {len(clean)} dropped {total - len(clean)}")
     print(f" segments: {len(segs)}")
     for s in segs:
         preview = s["text"][:70].replace("\n", " ")
         print(f"  [{s['segment_id']}] pages {s['page_numbers']} \"{preview}...\"")
-    outp.write_text(json.dumps(segs, indent=2), encoding="utf-8")
+    # store page spans into the OCR json rather than a second copy of the text
+    size = path.stat().st_size
+    compact = [compact_segment(s, spans_by_page, path.name, size, digest) for s in segs]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    outp.write_text(json.dumps(compact, indent=2), encoding="utf-8")
     print("saved:", outp.name)
+    return total
 
 
 def main():
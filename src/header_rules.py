@@ -0,0 +1,180 @@
+import re
+
+# -----------------------------
+# Rule-based extraction of NDIC form header fields
+# -----------------------------
+
+ND_COUNTIES = [
+    "Adams", "Barnes", "Benson", "Billings", "Bottineau", "Bowman", "Burke", "Burleigh",
+    "Cass", "Cavalier", "Dickey", "Divide", "Dunn", "Eddy", "Emmons", "Foster",
+    "Golden Valley", "Grand Forks", "Grant", "Griggs", "Hettinger", "Kidder", "LaMoure",
+    "Logan", "McHenry", "McIntosh", "McKenzie", "McLean", "Mercer", "Morton", "Mountrail",
+    "Nelson", "Oliver", "Pembina", "Pierce", "Ramsey", "Ransom", "Renville", "Richland",
+    "Rolette", "Sargent", "Sheridan", "Sioux", "Slope", "Stark", "Steele", "Stutsman",
+    "Towner", "Traill", "Walsh", "Ward", "Wells", "Williams",
+]
+COUNTY_NAMES = "|".join(re.escape(c) for c in sorted(ND_COUNTIES, key=len, reverse=True))
+COUNTY_RE = re.compile(rf"\b({COUNTY_NAMES})\s+(?:county|co\.)|county\s*[:|]?\s*({COUNTY_NAMES})\b", re.I)
+COUNTY_WORD_RE = re.compile(rf"\b({COUNTY_NAMES})\b", re.I)
+
+# North Dakota API numbers: state 33, county 3 digits, well 5 digits
+API_RE = re.compile(r"\b33\s*-?\s*(\d{3})\s*-?\s*(\d{5})\b")
+
+WELL_NAME_RES = [
+    re.compile(r"\bwell(?: name(?: and number)?)?\s*[:;]\s*([^\n]+)", re.I),  # "WELL: BASIC GAME & FISH 34-3"
+    re.compile(r"well name[^\n]*\n\s*([^\n]+)", re.I),                        # label row, value row below
+]
+# names end in a well number: 34-3, 2-15H, 5300 11-18T, 7-6H
+WELL_NAME_RE = re.compile(r"^([A-Za-z][A-Za-z0-9&'.,#\- ]*?\d+[A-Z]?(?:-\d+[A-Z0-9]*)+(?: \d{1,2}[A-Z]{1,2}\b)?)")
+OPERATOR_HEADER_RE = re.compile(r"^[\s|\[]*(?:name of )?operator\b[^\n:]*?(?::\s*([^\n]+)|\n\s*([^\n]+))", re.I | re.M)
+OPERATOR_CUT_RE = re.compile(r"\(?\d{3}[)\-. ]\s*\d{3}-\d{4}|[|\[\]]|\s{3,}")
+# values that do not look like a company are usually signature blocks or prose
+COMPANY_RE = re.compile(
+    r"\b(?:llc|l\.l\.c|inc|corp|corporation|company|co|ltd|lp|petroleum|energy|oil|resources|"
+    r"operating|exploration|production)\b\.?", re.I
+)
+
+TOWNSHIP_RE = re.compile(r"(?:\bT\s?|(?<!\w))(1[2-6]\d)\s*\.?\s*N\b")
+RANGE_RE = re.compile(r"(?:\bR\s?|(?<!\w))(\d{2,3})\s*\.?\s*W\b")
+INLINE_TOWNSHIP_RE = re.compile(r"township\s*:\s*(1[2-6]\d)\b", re.I)
+INLINE_RANGE_RE = re.compile(r"range\s*:\s*(\d{2,3})\b", re.I)
+SECTION_RE = re.compile(r"\bsec(?:tion|\.)?\s*[:#]?\s*(\d{1,2})\b", re.I)
+# "10-153N-101W": section, township and range in one
+LOCATION_RE = re.compile(r"\b(\d{1,2})\s*-\s*T?(1[2-6]\d)\s*N\s*-\s*R?(\d{2,3})\s*W\b", re.I)
+
+LAT_RE = re.compile(r"\b(4[5-9]\.\d{4,})\b")
+LON_RE = re.compile(r"(?<![\d.])-?\s?(9[7-9]\.\d{4,}|10[0-4]\.\d{4,})\b")
+# 48° 02' 38.97 N, OCR often turns ' into °
+LAT_DMS_RE = re.compile(r"\blat\w*\W{0,3}(4[5-9])\s*°\s*(\d{1,2})\s*['’°]\s*(\d{1,2}(?:[.,]\d+)?)", re.I)
+LON_DMS_RE = re.compile(r"\blong\w*\W{0,3}(9[7-9]|10[0-4])\s*°\s*(\d{1,2})\s*['’°]\s*(\d{1,2}(?:[.,]\d+)?)", re.I)
+
+STIMULATION_RE = re.compile(
+    r"stimulat|proppant|treatment type|acid\s*%|acidiz|\d\s*% (?:hcl|acid)|max(?:imum)? treatment|"
+    r"frac(?:ture)?d? (?:with|w/|job|treatment|stages?)|sand frac|plug (?:&|and) perf",
+    re.I
+)
+
+# a labelled field the rules could not read means the LLM may do better
+LABEL_RES = {
+    "api_number": re.compile(r"\bapi\b", re.I),
+    "well_name": re.compile(r"well name", re.I),
+    "operator": re.compile(r"^[\s|\[]*(?:name of )?operator\b", re.I | re.M),
+    "county": re.compile(r"\bcounty\b", re.I),
+    "township": re.compile(r"\btownship\b|\btwp\b", re.I),
+    "range": re.compile(r"\brange\b|\brng\b", re.I),
+    "section": re.compile(r"\bsection\b", re.I),
+    "latitude": re.compile(r"\blatitude\b", re.I),
+    "longitude": re.compile(r"\blongitude\b", re.I),
+}
+
+# how much each field counts towards the rule confidence
+WEIGHTS = {
+    "api_number": 0.30,
+    "well_name": 0.25,
+    "operator": 0.15,
+    "county": 0.10,
+    "township": 0.07,
+    "range": 0.07,
+    "section": 0.06,
+    "latitude": 0.05,
+    "longitude": 0.05,
+}
+HEADER_REGION = 3000  # characters of the segment the header rules look at
+
+
+def has_stimulation_table(text):
+    return STIMULATION_RE.search(text) is not None
+
+
+def _api(t):
+    m = API_RE.search(t)
+    return f"33-{m.group(1)}-{m.group(2)}" if m else None
+
+
+def _well_name(t):
+    for regex in WELL_NAME_RES:
+        for m in regex.finditer(t):
+            name = WELL_NAME_RE.match(m.group(1).strip())
+            if name:
+                return name.group(1).strip()
+    return None
+
+
+def _operator(t):
+    for m in OPERATOR_HEADER_RE.finditer(t):
+        value = OPERATOR_CUT_RE.split(m.group(1) or m.group(2))[0].strip(" :-_.~'\"‘’")
+        if len(value.split()) > 1 and COMPANY_RE.search(value) and not re.search(r"representative|telephone|address", value, re.I):
+            return value
+    return None
+
+
+def _county(t):
+    m = COUNTY_RE.search(t)
+    if m:
+        name = m.group(1) or m.group(2)
+    else:
+        # table layout: "... [Range [County" header with the value row below it
+        header = re.search(r"[^\n]*\bcounty\s*\n([^\n]+)", t, re.I)
+        words = COUNTY_WORD_RE.findall(header.group(1)) if header else []
+        if not words:
+            return None
+        name = words[-1]
+    return next(c for c in ND_COUNTIES if c.lower() == name.lower())
+
+
+def _valid_range(value):
+    # ND ranges run 47W-107W; OCR noise like "1101 W" is dropped
+    return 47 <= int(value) <= 107
+
+
+def _location(t):
+    """(section, township, range), each None when not found."""
+    m = LOCATION_RE.search(t)
+    if m and 1 <= int(m.group(1)) <= 36 and _valid_range(m.group(3)):
+        return m.group(1), f"{m.group(2)}N", f"{m.group(3)}W"
+
+    township = INLINE_TOWNSHIP_RE.search(t) or TOWNSHIP_RE.search(t)
+    range_ = INLINE_RANGE_RE.search(t) or RANGE_RE.search(t)
+    section = next((s.group(1) for s in SECTION_RE.finditer(t) if 1 <= int(s.group(1)) <= 36), None)
+    return (
+        section,
+        f"{township.group(1)}N" if township else None,
+        f"{range_.group(1)}W" if range_ and _valid_range(range_.group(1)) else None,
+    )
+
+
+def _coordinate(dms_re, decimal_re, t, sign=1):
+    m = dms_re.search(t)
+    if m:
+        degrees, minutes, seconds = m.group(1), m.group(2), m.group(3).replace(",", ".")
+        return round(sign * (int(degrees) + int(minutes) / 60 + float(seconds) / 3600), 6)
+    m = decimal_re.search(t)
+    return sign * float(m.group(1)) if m else None
+
+
+def extract_header(text):
+    """
+    Header fields of the SYSTEM_PROMPT schema from regular NDIC form layouts.
+    Returns (record, confidence) where confidence is in [0, 1].
+    """
+    t = text[:HEADER_REGION]
+    section, township, range_ = _location(t)
+
+    record = {
+        "api_number": _api(t),
+        "well_name": _well_name(t),
+        "operator": _operator(t),
+        "county": _county(t),
+        "township": township,
+        "range": range_,
+        "section": section,
+        "latitude": _coordinate(LAT_DMS_RE, LAT_RE, t),
+        "longitude": _coordinate(LON_DMS_RE, LON_RE, t, -1),
+        "stimulation_events": []
+    }
+    found = sum(w for field, w in WEIGHTS.items() if record[field])
+    expected = sum(w for field, w in WEIGHTS.items() if record[field] or LABEL_RES[field].search(t))
+    # nothing to identify the well by: leave it to the LLM
+    if not (record["api_number"] or record["well_name"]) or not expected:
+        return record, 0.0
+    return record, round(found / expected, 3)
@@ -0,0 +1,52 @@
+from pathlib import Path
+from disk_cache import DiskCache, make_key
+
+base = Path(__file__).resolve().parent.parent
+CACHE_PATH = base / "data" / "cache" / "llm_cache.sqlite"
+
+CACHE_MB = 256
+TTL_DAYS = 30
+
+# shared by extract_entities and llm_clean_extraction, opened by open_cache()
+_cache = None
+
+
+def open_cache(enabled=True, path=CACHE_PATH, max_mb=CACHE_MB, ttl_days=TTL_DAYS):
+    global _cache
+    _cache = DiskCache(path, max_bytes=max_mb * 1024 * 1024, ttl=ttl_days * 86400) if enabled else None
+    return _cache
+
+
+def prompt_key(model, template, text):
+    # a schema/prompt tweak changes the template hash and misses the old entries
+    return make_key(model, make_key(template), text)
+
+
+def cached_response(model, template, text, call):
+    """
+    Return the cached response for (model, template, text), or run `call()`
+    and cache what it returns. A None result (failed call) is not cached.
+    """
+    if _cache is None:
+        return call()
+
+    key = prompt_key(model, template, text)
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit
+
+    result = call()
+    if result is not None:
+        _cache.put(key, result)
+    return result
+
+
+def report():
+    if _cache is None:
+        return
+    stats = _cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    if lookups:
+        print(f"llm cache: {stats['hits']}/{lookups} hits ({stats['hit_rate']:.0%}), "
+              f"{stats['misses']} API calls")
+    _cache.close()
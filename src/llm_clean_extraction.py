@@ -1,16 +1,30 @@
 import re
 import json
-import os
-import requests
-from google import genai 
-from dotenv import load_dotenv
+import time
+import difflib
+import hashlib
+import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pydantic import BaseModel, Field 
 from typing import List, Optional 
+import llm_cache
+import llm_backend
+from header_rules import ND_COUNTIES
+from stim_events import dedupe_events
+from rate_limit import RateLimiter, retry_hint, estimate_tokens
 
 base = Path(__file__).resolve().parent.parent
 INPUT = base / "data" / "structured"
 OUTPUT = base / "data" / "final_outputs"
+# input hash per well at the time its final output was written (kept out of
+# final_outputs, which the loader globs)
+RECONCILE_MANIFEST = base / "data" / "reconcile_manifest.json"
+
+# wells reconciled at once; the limiter, not the pool size, sets the API rate
+WORKERS = 8
+REQUESTS_PER_MINUTE = 15
+TOKENS_PER_MINUTE = 250000
 
 OUTPUT.mkdir(parents=True, exist_ok=True)
 
@@ -110,7 +124,7 @@ def clean_segments(segments):
         data = segment["data"]
 
         cleaned_data = {
-            "api_number": validate_api(data.get("api_number")),
+            "api_number": validate_api(normalize_api(data.get("api_number"))),
             "well_name": data.get("well_name"),
             "operator": data.get("operator"),
             "county": data.get("county"),
@@ -127,38 +141,130 @@ def clean_segments(segments):
 
     return cleaned
 
-def process(input_path, output_path):
-    for json_file in sorted(input_path.glob("*.json")):
-        print(f"\nProcessing: {json_file.name}")
+def process_file(json_file, output_path, use_llm=True, limiter=None):
+    """
+    Returns (fields sent to the LLM as conflicts, empty if resolved locally;
+    number of duplicate stimulation events collapsed).
+    """
+    with open(json_file, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+
+    # Clean segments (your rule-based validator)
+    cleaned_segments = clean_segments(segments)
+
+    # Vote locally; Gemini only settles the fields the segments disagree on
+    final, conflicts = reconcile_locally(cleaned_segments)
+    if conflicts and use_llm:
+        final = resolve_conflicts(final, conflicts, reconcile_with_gemini(cleaned_segments, limiter))
 
-        try:
-            with open(json_file, "r", encoding="utf-8") as f:
-                segments = json.load(f)
+    # Save finalized output
+    output_file = output_path / json_file.name
 
-            # Clean segments (your rule-based validator)
-            cleaned_segments = clean_segments(segments)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(final.model_dump(), f, indent=2)
+
+    reported = sum(isinstance(e, dict) for s in cleaned_segments for e in s["data"]["stimulation_events"] or [])
+    return conflicts, reported - len(final.stimulation_events or [])
+
+
+# -----------------------------
+# Skip Unchanged Wells
+# -----------------------------
 
-            # Send to Gemini
-            final_json_text = reconcile_with_gemini(cleaned_segments)
+def file_sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
 
-            # Save finalized output
-            output_file = output_path / json_file.name
 
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(final_json_text.model_dump(), f, indent=2)
+def reconcile_version():
+    # a change to this script (prompt, vote rules, schema) or the event matching reconciles every well again
+    return hashlib.sha256("".join(file_sha256(Path(__file__).parent / name)
+                                  for name in ["llm_clean_extraction.py", "stim_events.py"]).encode()).hexdigest()
 
-            print("Successfully finalized")
 
-        except Exception as e:
-            print(f"Error processing {json_file.name}: {e}")
-            
+def load_reconcile_manifest():
+    if RECONCILE_MANIFEST.exists():
+        return json.loads(RECONCILE_MANIFEST.read_text(encoding="utf-8"))
+    return {}
 
 
-load_dotenv()
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+def save_reconcile_manifest(manifest):
+    tmp = RECONCILE_MANIFEST.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(RECONCILE_MANIFEST)
 
-def reconcile_with_gemini(cleaned_segments):
-    prompt = f"""
+
+def is_current(entry, input_hash, output_file, version, use_llm):
+    """The final output was produced from this exact input by this version of the script."""
+    if not entry or entry["input"] != input_hash or entry["version"] != version:
+        return False
+    # a --local-only result still has conflicts the LLM has not seen
+    if use_llm and entry["conflicts"] and not entry["used_llm"]:
+        return False
+    return output_file.exists() and file_sha256(output_file) == entry["output"]
+
+
+def process(input_path, output_path, use_llm=True, workers=WORKERS, limiter=None, force=False):
+    start = time.perf_counter()
+    local = with_llm = skipped = failed = duplicates = 0
+
+    if limiter is None:
+        limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+    manifest = load_reconcile_manifest()
+    version = reconcile_version()
+
+    pending = {}
+    for json_file in sorted(input_path.glob("*.json")):
+        input_hash = file_sha256(json_file)
+        if not force and is_current(manifest.get(json_file.name), input_hash,
+                                    output_path / json_file.name, version, use_llm):
+            skipped += 1
+            continue
+        pending[json_file] = input_hash
+
+    print(f"{len(pending)} wells to reconcile, {skipped} unchanged since their final output")
+
+    # wells are independent; the shared limiter keeps the LLM calls within quota
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(process_file, f, output_path, use_llm, limiter): f for f in pending}
+
+        for future in as_completed(futures):
+            json_file = futures[future]
+            try:
+                conflicts, collapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error processing {json_file.name}: {e}")
+                continue
+
+            duplicates += collapsed
+            note = f", {collapsed} duplicate events collapsed" if collapsed else ""
+            if conflicts:
+                with_llm += 1
+                print(f"{json_file.name}: finalized (conflicts: {', '.join(conflicts)}{note})")
+            else:
+                local += 1
+                print(f"{json_file.name}: finalized{f' ({note[2:]})' if note else ''}")
+
+            manifest[json_file.name] = {
+                "input": pending[json_file],
+                "output": file_sha256(output_path / json_file.name),
+                "version": version,
+                "conflicts": conflicts,
+                "used_llm": use_llm
+            }
+            save_reconcile_manifest(manifest)
+
+    print(f"\n{local} wells reconciled locally, {with_llm} with conflicts "
+          f"{'sent to the LLM' if use_llm else 'left to the local vote'}, {skipped} skipped, "
+          f"{failed} failed, {duplicates} duplicate stimulation events collapsed "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+
+MODEL = "gemini-3-flash-preview"
+
+RECONCILE_PROMPT = """
 You are given multiple segments (based on segment_id) with candidate data extracted from a scanned oil well PDF.
 
 Each segment may contain correct, partial, or incorrect values.
@@ -172,23 +278,320 @@ Your task:
 6. Normalize casing (e.g., proper title case for county, uppercase for operator).
 
 Candidate Segments:
-{json.dumps(cleaned_segments, indent=2)}
+{segments}
 
 Return ONLY valid JSON.
 """
 
-    response = client.models.generate_content(
-        model="gemini-3-flash-preview",
-        contents=prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": OilWell.model_json_schema()
-        })
-    result = OilWell.model_validate_json(response.text)
+
+def reconcile_with_gemini(cleaned_segments, limiter=None, retries=3):
+    segments = json.dumps(cleaned_segments, indent=2)
+    prompt = RECONCILE_PROMPT.format(segments=segments)
+    schema = OilWell.model_json_schema()
+
+    def call():
+        for attempt in range(retries):
+            if limiter is not None:
+                limiter.acquire(estimate_tokens(prompt))
+            try:
+                text = llm_backend.generate(MODEL, prompt, config={
+                    "response_mime_type": "application/json",
+                    "response_schema": schema
+                })
+                OilWell.model_validate_json(text)  # never cache a response that fails the schema
+                if limiter is not None:
+                    limiter.success()
+                return text
+            except Exception as e:
+                hint = retry_hint(e)
+                wait = hint + 2 if hint is not None else 2 ** attempt
+                print(f"  reconcile call failed, waiting {wait:.0f}s (attempt {attempt+1}): {e}")
+                if limiter is not None and hint is not None:
+                    # hold every well, not just this one, and slow the bucket down
+                    limiter.pause(wait)
+                else:
+                    time.sleep(wait)
+        return None
+
+    # template key covers both the instructions and the response schema
+    template = RECONCILE_PROMPT + json.dumps(schema, sort_keys=True)
+    raw = llm_cache.cached_response(MODEL, template, segments, call)
+    if raw is None:
+        raise RuntimeError(f"no valid reconciliation after {retries} attempts")
+    result = OilWell.model_validate_json(raw)
     return result
 
+
+# -----------------------------
+# Local Reconciliation
+# -----------------------------
+
+HEADER_FIELDS = ["api_number", "well_name", "operator", "county", "township_range", "latitude", "longitude"]
+
+FUZZY_MATCH = 0.85      # difflib ratio for two names/operators to count as the same value
+CONFLICT_RATIO = 0.75   # runner-up weight / winner weight at which a field is a real conflict
+COORD_TOLERANCE = 0.05  # degrees for two positions to agree (surface and bottom hole of one well)
+TOWNSHIP_TOLERANCE = 0.15  # degrees of latitude a position may sit from its township
+
+# North Dakota, for sanity checks on extracted coordinates and locations
+LAT_RANGE = (45.9, 49.1)
+LON_RANGE = (-104.1, -96.5)
+TOWNSHIP_RANGE = (129, 163)
+RANGE_RANGE = (47, 107)
+
+
+def segment_weight(data):
+    # segments that read like a header (many fields filled) count more than a stray mention
+    filled = sum(1 for field in HEADER_FIELDS if data.get(field) is not None)
+    return 1 + filled / len(HEADER_FIELDS)
+
+
+def match_key(value):
+    return re.sub(r"[^a-z0-9]", "", str(value).lower())
+
+
+def cluster(candidates, similar):
+    """
+    Group (value, weight) candidates; similar(a, b) decides if two values are
+    the same thing. Returns [(total weight, [(value, weight), ...])], heaviest first.
+    """
+    clusters = []
+    for value, weight in candidates:
+        for c in clusters:
+            if similar(c[1][0][0], value):
+                c[0] += weight
+                c[1].append((value, weight))
+                break
+        else:
+            clusters.append([weight, [(value, weight)]])
+    return sorted(((w, members) for w, members in clusters), key=lambda c: -c[0])
+
+
+def fuzzy_similar(a, b):
+    a, b = match_key(a), match_key(b)
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= FUZZY_MATCH
+
+
+def representative(members, prefer=None):
+    """Most supported spelling in a cluster; `prefer` breaks ties between spellings (e.g. not all caps)."""
+    totals = {}
+    for value, weight in members:
+        totals[value] = totals.get(value, 0) + weight
+    return max(totals, key=lambda v: (totals[v], prefer(v) if prefer else 0, len(v)))
+
+
+def vote(candidates, similar):
+    """(winning cluster members or None, is_conflict)."""
+    clusters = cluster(candidates, similar)
+    if not clusters:
+        return None, False
+    conflict = len(clusters) > 1 and clusters[1][0] >= CONFLICT_RATIO * clusters[0][0]
+    return clusters[0][1], conflict
+
+
+def strings(value):
+    """Candidate strings from a field the LLM returned as a string or a list of them."""
+    values = value if isinstance(value, list) else [value]
+    return [v.strip() for v in values if isinstance(v, str) and v.strip()]
+
+
+# characters OCR reads in place of digits, fixed only inside runs that hold a digit
+OCR_DIGITS = str.maketrans("OoDIl|SB", "00011158")
+DIGIT_RUN_RE = re.compile(r"[0-9OoDIl|SB]*[0-9][0-9OoDIl|SB]*")
+
+
+def normalize_api(value):
+    # "33-1O5-O2345", "33 105 02345", "33-105-02345-00-00", "105-02345" -> "3310502345"
+    if not value:
+        return None
+    digits = "".join(run.translate(OCR_DIGITS) for run in DIGIT_RUN_RE.findall(str(value)))
+    if len(digits) in (12, 14) and digits.startswith("33"):
+        digits = digits[:10]  # sidetrack and event suffixes
+    elif len(digits) == 8:
+        digits = "33" + digits  # county and well number without the state code
+    return digits
+
+
+def normalize_county(value):
+    if not value:
+        return None
+    name = re.sub(r"\s+county$", "", str(value).strip(), flags=re.I)
+    match = difflib.get_close_matches(name.title(), ND_COUNTIES, n=1, cutoff=0.8)
+    return match[0] if match else None
+
+
+def normalize_township_range(value):
+    # "153 N, 100 W", "T153N, R100W", "153, 100" -> "153N, 100W"
+    numbers = [int(n) for n in re.findall(r"\d+", str(value or ""))]
+    if len(numbers) != 2:
+        return None
+    township, range_ = numbers
+    if not (TOWNSHIP_RANGE[0] <= township <= TOWNSHIP_RANGE[1] and RANGE_RANGE[0] <= range_ <= RANGE_RANGE[1]):
+        return None
+    return f"{township}N, {range_}W"
+
+
+def township_latitude(township_range):
+    # townships are six miles (~0.0868 degrees) tall, counted from 45.935 N at T129N
+    township = int(re.match(r"\d+", township_range).group())
+    return 45.935 + (township - 128.5) * 0.0868
+
+
+def normalize_position(lat, lon):
+    lat, lon = validate_lat_lon(lat), validate_lat_lon(lon)
+    if lat is None or lon is None:
+        return None
+    if lon > 0:
+        lon = -lon  # west longitudes are often extracted without the sign
+    if LAT_RANGE[0] <= lat <= LAT_RANGE[1] and LON_RANGE[0] <= lon <= LON_RANGE[1]:
+        return lat, lon
+    return None
+
+
+def positions_agree(a, b):
+    return abs(a[0] - b[0]) <= COORD_TOLERANCE and abs(a[1] - b[1]) <= COORD_TOLERANCE
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def reconcile_locally(cleaned_segments):
+    """
+    Weighted vote per field across the cleaned segments of a well.
+    Returns (OilWell, [fields whose candidates genuinely disagree]).
+    """
+    candidates = {field: [] for field in ["api_number", "well_name", "operator", "county",
+                                          "township_range", "position"]}
+    events = []
+
+    for segment in cleaned_segments:
+        data = segment["data"]
+        weight = segment_weight(data)
+
+        api = validate_api(normalize_api(data.get("api_number")))
+        values = {
+            # NDIC API numbers all start with the state code 33
+            "api_number": [api] if api and api.startswith("33-") else [],
+            "well_name": strings(data.get("well_name")),
+            "operator": [v.upper() for v in strings(data.get("operator"))],
+            "county": [normalize_county(v) for v in strings(data.get("county"))],
+            "township_range": [normalize_township_range(data.get("township_range"))],
+            "position": [normalize_position(data.get("latitude"), data.get("longitude"))],
+        }
+        for field, found in values.items():
+            candidates[field].extend((value, weight) for value in found if value is not None)
+
+        events.extend(e for e in data.get("stimulation_events") or [] if isinstance(e, dict))
+
+    final, conflicts = {}, []
+    exact = lambda a, b: a == b
+    for field, similar in [("api_number", exact), ("well_name", fuzzy_similar), ("operator", fuzzy_similar),
+                           ("county", exact), ("township_range", exact)]:
+        members, conflict = vote(candidates[field], similar)
+        # names: of equally supported spellings, keep one that is not all caps
+        final[field] = representative(members, prefer=lambda v: not v.isupper()) if members else None
+        if conflict:
+            conflicts.append(field)
+
+    # a position must also sit in the township the segments agree on
+    positions = candidates["position"]
+    if final["township_range"]:
+        expected = township_latitude(final["township_range"])
+        positions = [(p, w) for p, w in positions if abs(p[0] - expected) <= TOWNSHIP_TOLERANCE]
+    members, conflict = vote(positions, positions_agree)
+    final["latitude"] = round(median([p[0] for p, _ in members]), 6) if members else None
+    final["longitude"] = round(median([p[1] for p, _ in members]), 6) if members else None
+    if conflict:
+        conflicts += ["latitude", "longitude"]
+
+    # the same job is reported on several forms; keep one event per job
+    final["stimulation_events"] = dedupe_events([normalize_event(e) for e in events])
+    return OilWell(**final), conflicts
+
+
+def to_number(value, kind=float):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return kind(float(str(value).replace(",", "")))
+    except ValueError:
+        return None
+
+
+def normalize_event(event):
+    """Fill in every StimEvents field, coercing numbers that came back as strings."""
+    out = {}
+    for name, field in StimEvents.model_fields.items():
+        value = event.get(name)
+        if name == "proppant_breakdown":
+            value = [{"type": d.get("type"), "volume": to_number(d.get("volume"))}
+                     for d in value or [] if isinstance(d, dict)]
+        elif field.annotation == Optional[float]:
+            value = to_number(value)
+        elif field.annotation == Optional[int]:
+            value = to_number(value, int)
+        out[name] = value
+    return out
+
+
+def checked_llm_values(llm, township_range):
+    """The LLM's header fields after the checks the local vote applies; None where one fails."""
+    api = validate_api(normalize_api(llm.api_number))
+    values = {
+        "api_number": api if api and api.startswith("33-") else None,
+        "well_name": (strings(llm.well_name) or [None])[0],
+        "operator": (strings(llm.operator) or [None])[0],
+        "county": normalize_county(llm.county),
+        "township_range": normalize_township_range(llm.township_range),
+    }
+    if values["operator"]:
+        values["operator"] = values["operator"].upper()
+
+    position = normalize_position(llm.latitude, llm.longitude)
+    township_range = values["township_range"] or township_range
+    if position and township_range and abs(position[0] - township_latitude(township_range)) > TOWNSHIP_TOLERANCE:
+        position = None
+    values["latitude"], values["longitude"] = position or (None, None)
+    return values
+
+
+def resolve_conflicts(local, conflicts, llm):
+    """
+    Take only the conflicting fields from the LLM's reconciliation, and only
+    values that pass the same checks as the local vote; the rest keep the local pick.
+    """
+    merged = local.model_dump()
+    township_range = merged["township_range"] if "township_range" not in conflicts else None
+    checked = checked_llm_values(llm, township_range)
+    for field in conflicts:
+        if checked[field] is not None:
+            merged[field] = checked[field]
+    return OilWell(**merged)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="reconcile extracted segments into one record per well")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    parser.add_argument("--local-only", action="store_true",
+                        help="never call the LLM, settle conflicts with the local vote")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="wells reconciled at once")
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE,
+                        help="requests per minute, 0 = unlimited")
+    parser.add_argument("--tpm", type=float, default=TOKENS_PER_MINUTE,
+                        help="input tokens per minute, 0 = unlimited")
+    parser.add_argument("--force", action="store_true", help="reconcile wells whose input has not changed")
+    args = parser.parse_args()
+
+    llm_cache.open_cache(not args.no_cache)
     process(
         input_path=INPUT,
-        output_path=OUTPUT
-    )
\ No newline at end of file
+        output_path=OUTPUT,
+        use_llm=not args.local_only,
+        workers=args.workers,
+        limiter=RateLimiter(args.rpm, args.tpm or None),
+        force=args.force
+    )
+    llm_cache.report()
\ No newline at end of file
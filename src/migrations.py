@@ -0,0 +1,224 @@
+"""
+Versioned schema migrations for oil_wells_db.
+
+sql_db.TABLES is version 0. Each entry of MIGRATIONS moves the schema one
+version forward; schema_migrations records which versions a database has,
+and migrate() applies the missing ones in order. Migrations are never
+edited once released: a schema change is a new entry at the end.
+
+MySQL commits DDL implicitly, so a migration that fails halfway is not
+rolled back. migrate() skips a step whose index, column or trigger
+already exists, so after fixing the cause the same migration is simply
+run again. Needs MySQL 8.0 or later (SRID column attributes and the
+axis-order option of the spatial migration); MariaDB is not supported.
+
+  python migrations.py            # apply pending migrations
+  python migrations.py --status
+"""
+import argparse
+from mysql.connector import Error, errorcode
+import db
+from stim_events import stimulation_date
+
+BACKFILL_BATCH = 5000
+
+# wells without coordinates still need a location for the NOT NULL SPATIAL
+# index; they get this point (off the coast of Africa, far from North Dakota)
+SENTINEL_POINT = "ST_GeomFromText('POINT(0 0)', 4326)"
+
+# what a repeated CREATE INDEX / ADD COLUMN / CREATE TRIGGER fails with
+ALREADY_APPLIED = {errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME, errorcode.ER_TRG_ALREADY_EXISTS}
+
+
+def location_sql(row):
+    """SQL for the POINT of a wells row ("NEW" in triggers, "wells" in the backfill)."""
+    return (f"IF({row}.latitude IS NULL OR {row}.longitude IS NULL, {SENTINEL_POINT}, "
+            f"ST_GeomFromText(CONCAT('POINT(', {row}.longitude, ' ', {row}.latitude, ')'), "
+            f"4326, 'axis-order=long-lat'))")
+
+
+def index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def drop_index(table, index, fk_column):
+    """
+    Step that drops an index made redundant by the foreign key index on
+    fk_column. MySQL silently drops an FK's own index once another index can
+    serve the FK, so it is put back first if needed. Does nothing if the
+    index is already gone.
+    """
+    def step(connection):
+        cursor = connection.cursor()
+        if index_exists(cursor, table, index):
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = %s AND index_name <> %s
+                  AND column_name = %s AND seq_in_index = 1
+            """, (table, index, fk_column))
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"ALTER TABLE {table} ADD INDEX {fk_column} ({fk_column})")
+            cursor.execute(f"ALTER TABLE {table} DROP INDEX {index}")
+        cursor.close()
+    return step
+
+
+def backfill_dates(connection):
+    """Parse date_stimulated into stimulated_on/date_precision for rows loaded before migration 2."""
+    cursor = connection.cursor()
+    last_id, seen, parsed_count = 0, 0, 0
+
+    # page through by primary key so a large table is never held in memory at once
+    while True:
+        cursor.execute("""
+            SELECT id, date_stimulated FROM stimulation_events
+            WHERE id > %s AND date_stimulated IS NOT NULL
+            ORDER BY id LIMIT %s
+        """, (last_id, BACKFILL_BATCH))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for event_id, text in rows:
+            parsed, precision = stimulation_date(text)
+            if parsed is not None:
+                updates.append((parsed, precision, event_id))
+        if updates:
+            cursor.executemany("UPDATE stimulation_events SET stimulated_on = %s, date_precision = %s WHERE id = %s",
+                               updates)
+        connection.commit()
+
+        last_id = rows[-1][0]
+        seen += len(rows)
+        parsed_count += len(updates)
+
+    cursor.close()
+    print(f"  parsed {parsed_count} of {seen} stimulation dates")
+
+
+MIGRATIONS = [
+    {
+        # build_geojson reads events ordered by (api_number, id) and proppant
+        # rows by (stimulation_event_id, id); the map filters by county/operator
+        "version": 1,
+        "name": "composite indexes",
+        "steps": [
+            "CREATE INDEX idx_events_api_id ON stimulation_events (api_number, id)",
+            "CREATE INDEX idx_proppant_event_id ON proppant_details (stimulation_event_id, id)",
+            "CREATE INDEX idx_wells_county_operator ON wells (county, operator)",
+        ],
+    },
+    {
+        # date_stimulated stays as OCR'd text; stimulated_on is what range queries use
+        "version": 2,
+        "name": "stimulation date column",
+        "steps": [
+            """ALTER TABLE stimulation_events
+                ADD COLUMN stimulated_on DATE NULL AFTER date_stimulated,
+                ADD COLUMN date_precision VARCHAR(5) NULL AFTER stimulated_on""",
+            backfill_dates,
+            "CREATE INDEX idx_events_stimulated_on ON stimulation_events (stimulated_on)",
+            "CREATE INDEX idx_events_formation_date ON stimulation_events (formation, stimulated_on)",
+        ],
+    },
+    {
+        # kept in step with latitude/longitude by triggers, so the loader and
+        # the web scraper (which corrects coordinates) need not know about it
+        "version": 3,
+        "name": "spatial well location",
+        "steps": [
+            "ALTER TABLE wells ADD COLUMN location POINT NULL SRID 4326",
+            f"UPDATE wells SET location = {location_sql('wells')}",
+            "ALTER TABLE wells MODIFY location POINT NOT NULL SRID 4326",
+            "ALTER TABLE wells ADD SPATIAL INDEX idx_wells_location (location)",
+            f"""CREATE TRIGGER wells_location_insert BEFORE INSERT ON wells
+                FOR EACH ROW SET NEW.location = {location_sql('NEW')}""",
+            f"""CREATE TRIGGER wells_location_update BEFORE UPDATE ON wells
+                FOR EACH ROW SET NEW.location = {location_sql('NEW')}""",
+        ],
+    },
+    {
+        # InnoDB secondary indexes end in the primary key, so the foreign key
+        # indexes on api_number and stimulation_event_id already serve the
+        # (api_number, id) and (stimulation_event_id, id) reads of migration 1
+        "version": 4,
+        "name": "drop redundant composite indexes",
+        "steps": [
+            drop_index("stimulation_events", "idx_events_api_id", "api_number"),
+            drop_index("proppant_details", "idx_proppant_event_id", "stimulation_event_id"),
+        ],
+    },
+]
+
+
+def applied_versions(connection):
+    cursor = connection.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return versions
+
+
+def migrate(connection, target=None):
+    """Apply pending migrations up to `target` (default: all). Returns the versions applied."""
+    done = applied_versions(connection)
+    applied = []
+
+    for migration in MIGRATIONS:
+        if migration["version"] in done or (target is not None and migration["version"] > target):
+            continue
+
+        print(f"Applying migration {migration['version']}: {migration['name']}")
+        cursor = connection.cursor()
+        for step in migration["steps"]:
+            if callable(step):
+                step(connection)
+                continue
+            try:
+                cursor.execute(step)
+            except Error as e:
+                # left behind by an earlier run of this migration that failed partway
+                if e.errno not in ALREADY_APPLIED:
+                    raise
+                print(f"  already applied: {' '.join(step.split()[:4])} ...")
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                       (migration["version"], migration["name"]))
+        connection.commit()
+        cursor.close()
+        applied.append(migration["version"])
+
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="apply schema migrations to the wells database")
+    parser.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    args = parser.parse_args()
+
+    connection = db.connect()
+    if args.status:
+        done = applied_versions(connection)
+        for migration in MIGRATIONS:
+            state = "applied" if migration["version"] in done else "pending"
+            print(f"{migration['version']:>3}  {state:<8} {migration['name']}")
+    else:
+        applied = migrate(connection, args.target)
+        print(f"Applied {len(applied)} migrations." if applied else "Schema is up to date.")
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Deterministic local stand-in for the LLM API, for load tests and benchmarks
+without network access.
+
+Speaks the protocol of llm_backend.HTTPBackend:
+  POST /generate {"model", "contents", "config"} -> 200 {"text": ...}
+  429 {"error": "... Please retry in Xs."}   rate limited (same hint format as Gemini)
+  500 {"error": "..."}                       injected server error
+  GET  /stats                                request counters
+
+Responses are replayed from a recordings file (JSONL of prompt_sha256 -> text).
+Prompts that were never recorded get a schema-shaped answer with every field
+null (an array of them, keyed by segment_id, for batched extraction prompts),
+so any corpus can be pushed through. Latency, error and rate-limit
+injection are seeded by the prompt and attempt number, so a run replays the
+same way regardless of thread scheduling.
+
+  python mock_llm_server.py --build-recordings      # from data/segments + data/structured
+  python mock_llm_server.py --latency 1.5 --error-rate 0.02 --rpm 60
+  LLM_BACKEND=http python extract_entities.py --no-cache
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_backend import prompt_hash
+
+base = Path(__file__).resolve().parent.parent
+RECORDINGS = base / "data" / "cache" / "llm_recordings.jsonl"
+
+EMPTY_EXTRACTION = {
+    "api_number": None, "well_name": None, "operator": None, "county": None,
+    "township": None, "range": None, "section": None,
+    "latitude": None, "longitude": None, "stimulation_events": []
+}
+BATCH_SEGMENT_RE = re.compile(r"^\[segment (\d+)\]$", re.M)
+EMPTY_WELL = {
+    "api_number": None, "well_name": None, "operator": None, "county": None,
+    "township_range": None, "latitude": None, "longitude": None, "stimulation_events": []
+}
+
+
+# -----------------------------
+# Recordings
+# -----------------------------
+
+def load_recordings(path):
+    recordings = {}
+    if Path(path).exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    recordings[rec["prompt_sha256"]] = rec["text"]
+    return recordings
+
+
+def extraction_requests(segments, by_id, reader):
+    """
+    (prompt, response text) for the extraction requests process_file sends
+    for one well: the same rule bypass, relevance filter and chunk plan, with
+    each request answered from the saved per-segment records.
+    """
+    import extract_entities
+    from chunker import plan_chunks
+
+    # segments without a saved record stay in the plan, so the others are packed
+    # as they would be, but get no answer of their own
+    pending = []
+    for segment in segments:
+        pages = reader.pages(segment)
+        if extract_entities.rule_answer("\n\n".join(pages)) is None:
+            pending.append((segment["segment_id"], pages))
+
+    requests = []
+    for chunk in plan_chunks(pending, extract_entities.CHUNK_TOKENS, extract_entities.BATCH_SIZE):
+        if "parts" in chunk:
+            answer = [{"segment_id": seg_id, **by_id[seg_id]} for seg_id in chunk["segment_ids"] if seg_id in by_id]
+            requests.append((extract_entities.BATCH_PROMPT + "\n\n" + chunk["texts"][0], json.dumps(answer)))
+            # a segment missing from the batch answer is asked for on its own, as with --batch 1
+            parts = chunk["parts"]
+        else:
+            # every piece of a split segment gets the whole record; merge_records gives it back unchanged
+            parts = [(chunk["segment_ids"][0], text) for text in chunk["texts"]]
+        for seg_id, text in parts:
+            if seg_id in by_id:
+                requests.append((extract_entities.SYSTEM_PROMPT + "\n\n" + text, json.dumps(by_id[seg_id])))
+    return requests
+
+
+def build_recordings(path):
+    """Rebuild the prompts both LLM stages send for the committed corpus, paired with the saved outputs."""
+    import extract_entities
+    import llm_clean_extraction
+    from segment_store import SegmentReader
+    from score_segments import load_relevance
+
+    reader = SegmentReader()
+    seen = set()
+    with open(path, "w", encoding="utf-8") as out:
+
+        def record(model, prompt, text):
+            key = prompt_hash(prompt)
+            if key not in seen:
+                seen.add(key)
+                out.write(json.dumps({"model": model, "prompt_sha256": key, "text": text}) + "\n")
+
+        for seg_file in sorted(extract_entities.INPUT.glob("*_segments.json")):
+            well_id = seg_file.stem.replace("_segments", "")
+            structured = extract_entities.OUTPUT / f"{well_id}_structured.json"
+            if not structured.exists():
+                continue
+
+            results = json.loads(structured.read_text(encoding="utf-8"))
+            by_id = {r["segment_id"]: r["data"] for r in results}
+            segments = json.loads(seg_file.read_text(encoding="utf-8"))
+            relevance = load_relevance(seg_file)
+            if relevance:
+                segments = [s for s in segments if relevance[s["segment_id"]]["relevant"]]
+            for prompt, text in extraction_requests(segments, by_id, reader):
+                record(extract_entities.MODEL, prompt, text)
+
+            final = llm_clean_extraction.OUTPUT / structured.name
+            if final.exists():
+                cleaned = llm_clean_extraction.clean_segments(results)
+                prompt = llm_clean_extraction.RECONCILE_PROMPT.format(segments=json.dumps(cleaned, indent=2))
+                record(llm_clean_extraction.MODEL, prompt, final.read_text(encoding="utf-8"))
+
+    reader.close()
+    print(f"wrote {len(seen)} recordings to {path}")
+
+
+# -----------------------------
+# Server
+# -----------------------------
+
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.recordings = load_recordings(args.recordings)
+        self.lock = threading.Lock()
+        self.window = deque()  # request times in the last minute, for --rpm
+        self.attempts = {}
+        self.stats = {"requests": 0, "ok": 0, "replayed": 0, "synthetic": 0,
+                      "rate_limited": 0, "errors": 0, "busy_seconds": 0.0}
+
+    def admit(self, key):
+        """Return (attempt number for this prompt, seconds until a slot frees up or 0)."""
+        with self.lock:
+            now = time.monotonic()
+            self.stats["requests"] += 1
+            attempt = self.attempts[key] = self.attempts.get(key, 0) + 1
+
+            while self.window and now - self.window[0] >= 60:
+                self.window.popleft()
+            if self.args.rpm and len(self.window) >= self.args.rpm:
+                return attempt, 60 - (now - self.window[0])
+            self.window.append(now)
+            return attempt, 0.0
+
+    def count(self, name, busy=0.0):
+        with self.lock:
+            self.stats[name] += 1
+            self.stats["busy_seconds"] += busy
+
+
+def make_handler(state):
+    args = state.args
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *a):
+            if args.verbose:
+                super().log_message(fmt, *a)
+
+        def reply(self, code, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with state.lock:
+                    self.reply(200, dict(state.stats))
+            else:
+                self.reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/generate":
+                self.reply(404, {"error": "not found"})
+                return
+
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            contents = req.get("contents") or ""
+            key = prompt_hash(contents)
+            attempt, wait = state.admit(key)
+            rng = random.Random(f"{args.seed}:{key}:{attempt}")
+
+            if wait:
+                state.count("rate_limited")
+                self.reply(429, {"error": f"429 RESOURCE_EXHAUSTED. Please retry in {wait:.1f}s."})
+                return
+            if rng.random() < args.rate_limit_rate:
+                state.count("rate_limited")
+                self.reply(429, {"error": f"429 RESOURCE_EXHAUSTED. Please retry in {args.retry_after:.1f}s."})
+                return
+
+            latency = max(0.0, args.latency + rng.uniform(-args.jitter, args.jitter)
+                          + args.ms_per_1k_chars * len(contents) / 1e6)
+            time.sleep(latency)
+
+            if rng.random() < args.error_rate:
+                state.count("errors", latency)
+                self.reply(500, {"error": "500 INTERNAL. Injected server error."})
+                return
+
+            text = state.recordings.get(key)
+            if text is not None:
+                state.count("replayed")
+            else:
+                config = req.get("config") or {}
+                batch_ids = BATCH_SEGMENT_RE.findall(contents)
+                if config.get("response_schema"):
+                    text = json.dumps(EMPTY_WELL)
+                elif batch_ids:
+                    text = json.dumps([{"segment_id": int(i), **EMPTY_EXTRACTION} for i in batch_ids])
+                else:
+                    text = json.dumps(EMPTY_EXTRACTION)
+                state.count("synthetic")
+            state.count("ok", latency)
+            self.reply(200, {"text": text})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="deterministic mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", default=str(RECORDINGS))
+    parser.add_argument("--build-recordings", action="store_true",
+                        help="write recordings from the committed corpus and exit")
+    parser.add_argument("--latency", type=float, default=1.0, help="mean seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.25, help="+/- seconds around --latency")
+    parser.add_argument("--ms-per-1k-chars", type=float, default=0.0, help="extra latency per prompt size")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of random 429s")
+    parser.add_argument("--retry-after", type=float, default=5.0, help="hint sent with random 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="enforced requests per minute, 0 = none")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.build_recordings:
+        Path(args.recordings).parent.mkdir(parents=True, exist_ok=True)
+        build_recordings(args.recordings)
+        return
+
+    state = MockState(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"mock LLM on http://{args.host}:{args.port} ({len(state.recordings)} recordings)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(state.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,607 @@
 import os
 import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import fitz
 import pytesseract
 from PIL import Image
+from disk_cache import DiskCache, make_key
+from filter_pages import page_features
 
 base = Path(__file__).resolve().parent.parent
 input_dir = base / "data" / "original_pdfs"
 output_dir = base / "data" / "ocr_json"
 
+cache_path = base / "data" / "cache" / "ocr_cache.sqlite"
+decisions_dir = base / "data" / "cache" / "ocr_decisions"
+
 output_dir.mkdir(parents=True, exist_ok=True)
 
+OCR_CONFIG = "--psm 6"
+CHUNK_PAGES = 4  # pages per work unit handed to a worker process
+CACHE_MB = 512
+
+# rasterization: aim for TARGET_DPI but never render more than MAX_PIXELS,
+# so large plats/surveys drop towards MIN_DPI instead of ballooning memory.
+# 144 dpi is the resolution of the old fixed 2x render
+TARGET_DPI = 144
+MIN_DPI = 100
+MAX_PIXELS = 12_000_000
+
+THRESHOLD = 140  # fixed binarization cutoff, or "otsu" to pick one per page
+
+# a short but clean text layer is trusted unless images cover this much of the page
+IMAGE_COVERAGE = 0.5
+
+# a text layer below these is OCR'd; OCR's own copies of the filter_pages garbage
+# thresholds, so tuning the filter does not re-OCR the corpus
+TEXT_MIN_LEN = 150
+TEXT_ALPHA_RATIO = 0.20
+TEXT_SINGLE_CHAR_RATIO = 0.40
+
+
+# -----------------------------
+# OCR backends
+# -----------------------------
+
+class PytesseractBackend:
+    """Runs the tesseract CLI once per page (new process, model reloaded every time)."""
+
+    name = "pytesseract"
+
+    def image_to_string(self, img):
+        return pytesseract.image_to_string(img, config=OCR_CONFIG)
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend:
+    """Keeps one tesseract engine, with its language model, loaded for the whole process."""
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+
+        psm = int(OCR_CONFIG.split("--psm")[1].split()[0]) if "--psm" in OCR_CONFIG else 3
+        self.api = tesserocr.PyTessBaseAPI(psm=psm)
+
+    def image_to_string(self, img):
+        self.api.SetImage(img)
+        return self.api.GetUTF8Text()
+
+    def close(self):
+        self.api.End()
+
+
+BACKENDS = {
+    "pytesseract": PytesseractBackend,
+    "tesserocr": TesserocrBackend,
+}
+
+
+def resolve_backend(name="auto"):
+    # "auto" prefers the persistent engine and falls back to the CLI wrapper
+    if name != "auto":
+        return name
+    try:
+        import tesserocr  # noqa: F401
+    except ImportError:
+        return "pytesseract"
+    return "tesserocr"
+
+
+def make_backend(name="auto"):
+    return BACKENDS[resolve_backend(name)]()
+
+
+# per-process settings, set up by configure() (also in each pool worker)
+_cache = None
+_backend = None
+_backend_name = "auto"
+_threshold = THRESHOLD
+_stats = {"hits": 0, "misses": 0, "ocr_pages": 0, "ocr_seconds": 0.0}
+
+
+def configure(cache_file=cache_path, cache_mb=CACHE_MB, threshold=THRESHOLD, backend="auto"):
+    global _cache, _backend, _backend_name, _threshold
+    if _cache is not None:
+        _cache.close()
+    _cache = DiskCache(cache_file, max_bytes=cache_mb * 1024 * 1024) if cache_file else None
+    if _backend is not None:
+        _backend.close()
+    # the engine itself is started lazily on the first page that needs OCR
+    _backend = None
+    _backend_name = resolve_backend(backend)
+    _threshold = threshold
+
+
+def run_stats():
+    return dict(_stats)
+
+
+def choose_zoom(page):
+    # page.rect is in points (1/72 inch)
+    area_in = (page.rect.width / 72) * (page.rect.height / 72)
+    dpi = TARGET_DPI
+    if area_in * dpi * dpi > MAX_PIXELS:
+        dpi = max(MIN_DPI, (MAX_PIXELS / area_in) ** 0.5)
+    return dpi / 72
+
+
+def otsu_threshold(hist):
+    # threshold maximizing between-class variance of a 256-bin histogram
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_bg = 0
+    weight_bg = 0
+    best, best_var = 0, -1.0
+
+    for t in range(256):
+        weight_bg += hist[t]
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += t * hist[t]
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        var = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if var > best_var:
+            best, best_var = t, var
+
+    return best + 1
+
+
+_luts = {}
+
+
+def binarize(img, threshold):
+    if threshold == "otsu":
+        threshold = otsu_threshold(img.histogram())
+    # a 256-entry lookup table is applied in C by PIL, no per-pixel Python calls
+    lut = _luts.get(threshold)
+    if lut is None:
+        lut = _luts[threshold] = [0] * threshold + [255] * (256 - threshold)
+    return img.point(lut)
+
+
+def render_page(page, threshold=None):
+    # render straight to 8-bit grayscale, a third of the bytes of RGB
+    zoom = choose_zoom(page)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    img = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+    img = binarize(img, _threshold if threshold is None else threshold)
+    return pix, img
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = make_backend(_backend_name)
+    return _backend
+
+
+def run_backend(img):
+    start = time.perf_counter()
+    text = get_backend().image_to_string(img)
+    _stats["ocr_pages"] += 1
+    _stats["ocr_seconds"] += time.perf_counter() - start
+    return text
+
+
+def ocr_image(pix, img):
+    if _cache is None:
+        return run_backend(img)
+
+    # identical pixels + identical settings -> identical text, so key on both
+    key = make_key(pix.samples, pix.width, pix.height, f"gray-bin{_threshold}",
+                   OCR_CONFIG, resolve_backend(_backend_name))
+    text = _cache.get(key)
+    if text is None:
+        _stats["misses"] += 1
+        text = run_backend(img)
+        _cache.put(key, text)
+    else:
+        _stats["hits"] += 1
+    return text
+
+
+# -----------------------------
+# Text layer vs OCR decision
+# -----------------------------
+
+def text_quality(text):
+    # rough count of "real" characters, same signals filter_pages uses for garbage
+    length, alpha, single = page_features(text)
+    return length * alpha * (1 - single)
+
+
+def image_coverage(page):
+    area = abs(page.rect) or 1
+    covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+    return min(covered / area, 1.0)
+
+
+def needs_ocr(page, text):
+    length, alpha, single = page_features(text)
+    if length == 0:
+        return True
+    # long but garbage text layer (bad OCR baked into the pdf, encoding junk)
+    if alpha < TEXT_ALPHA_RATIO or single > TEXT_SINGLE_CHAR_RATIO:
+        return True
+    # short clean text is fine unless it is just a stamp on top of a scan
+    if length < TEXT_MIN_LEN:
+        return image_coverage(page) >= IMAGE_COVERAGE
+    return False
+
+
+def read_page(page, skip_ocr=False):
+    """
+    Text for one page plus which path produced it:
+      text        text layer was good enough
+      ocr         page was OCR'd
+      text_kept   OCR was tried but did not beat the text layer
+      text_known  decision cache says OCR does not help on this page
+    """
+    start = time.perf_counter()
+
+    # first try reading existing text layer
+    text = page.get_text("text").strip()
+    source = "text"
+
+    if skip_ocr:
+        source = "text_known"
+    elif needs_ocr(page, text):
+        pix, img = render_page(page)
+        ocr_text = ocr_image(pix, img).strip()
+        if text_quality(ocr_text) >= text_quality(text):
+            text, source = ocr_text, "ocr"
+        else:
+            source = "text_kept"
+
+    return {
+        "page_number": page.number + 1,
+        "text": text,
+        "source": source,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+
 
 def extract_pdf_pages(pdf_path):
     doc = fitz.open(pdf_path)
     pages = []
 
     for i in range(len(doc)):
-        # first try reading existing text layer
-        text = doc[i].get_text("text").strip()
-
-        # if empty or too short, render as image and OCR directly
-        if len(text) < 50:
-            pix = doc[i].get_pixmap(matrix=fitz.Matrix(2, 2))
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            img = img.convert("L")  # grayscale
-            img = img.point(lambda x: 0 if x < 140 else 255)  # binarize
-            text = pytesseract.image_to_string(img, config="--psm 6")
-
-        pages.append({
-            "page_number": i + 1,
-            "text": text.strip()
-        })
+        pages.append(read_page(doc[i]))
 
     doc.close()
     return pages
 
 
+# -----------------------------
+# Streaming page log (one JSON line per finished page)
+# -----------------------------
+
+def page_log_path(pdf):
+    return output_dir / f"{pdf.stem}.pages.jsonl"
+
+
+def read_page_log(log_path):
+    """
+    Return {page_number: byte offset} for every complete line in the log.
+    A torn last line from a crash is truncated away so appends stay valid.
+    """
+    offsets = {}
+    if not log_path.exists():
+        return offsets
+
+    good = 0
+    with open(log_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                page = json.loads(line)
+            except ValueError:
+                break
+            offsets[page["page_number"]] = good
+            good += len(line)
+
+    if good < log_path.stat().st_size:
+        with open(log_path, "r+b") as f:
+            f.truncate(good)
+
+    return offsets
+
+
+def append_page(log, page):
+    log.write(json.dumps(page) + "\n")
+    log.flush()
+    os.fsync(log.fileno())
+
+
+# per-run bookkeeping kept in the page log and the decisions file, not in
+# ocr_json: the OCR output stays byte-identical when the text is
+RUN_FIELDS = ("source", "seconds")
+
+
+def compact_page_log(log_path, output_file):
+    """
+    Rewrite the log as the usual indented JSON array, one page in memory at a time.
+    Returns the pages read in order, without their text, for bookkeeping.
+    """
+    offsets = read_page_log(log_path)
+    tmp = output_file.with_suffix(".json.tmp")
+    pages = []
+
+    with open(log_path, "rb") as log, open(tmp, "w", encoding="utf-8") as out:
+        out.write("[")
+        for n, page_number in enumerate(sorted(offsets)):
+            log.seek(offsets[page_number])
+            page = json.loads(log.readline())
+            saved = {k: v for k, v in page.items() if k not in RUN_FIELDS}
+            out.write(("," if n else "") + "\n" + json.dumps([saved], indent=2)[2:-2])
+            pages.append({k: v for k, v in page.items() if k != "text"})
+        out.write("\n]" if offsets else "]")
+
+    os.replace(tmp, output_file)
+    log_path.unlink()
+    return pages
+
+
+# -----------------------------
+# Per-PDF decision cache (pages where OCR does not beat the text layer)
+# -----------------------------
+
+def pdf_fingerprint(pdf):
+    # size and mtime, like pipeline.py's hash cache: the PDF is not read just to hash it
+    st = Path(pdf).stat()
+    return make_key(st.st_size, st.st_mtime_ns, f"gray-bin{_threshold}", OCR_CONFIG,
+                    resolve_backend(_backend_name))
+
+
+def load_decisions(pdf):
+    path = decisions_dir / f"{Path(pdf).stem}.json"
+    if not path.exists():
+        return set()
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    if saved.get("fingerprint") != pdf_fingerprint(pdf):
+        return set()  # pdf or OCR settings changed, decide again
+    return set(saved["text_only"])
+
+
+def save_decisions(pdf, pages):
+    text_only = [p["page_number"] for p in pages if p.get("source") in ("text_kept", "text_known")]
+    decisions_dir.mkdir(parents=True, exist_ok=True)
+    path = decisions_dir / f"{Path(pdf).stem}.json"
+    # how each page was read and how long it took, from the last run
+    runs = {p["page_number"]: {k: p[k] for k in RUN_FIELDS if k in p} for p in pages}
+    path.write_text(json.dumps({"fingerprint": pdf_fingerprint(pdf), "text_only": text_only, "pages": runs}),
+                    encoding="utf-8")
+
+
+def finish_pdf(pdf):
+    pages = compact_page_log(page_log_path(pdf), output_dir / f"{pdf.stem}.json")
+    save_decisions(pdf, pages)
+
+    tally = {}
+    for p in pages:
+        count, seconds = tally.get(p.get("source", "unknown"), (0, 0.0))
+        tally[p.get("source", "unknown")] = (count + 1, seconds + p.get("seconds", 0.0))
+    print(f"  {pdf.stem}: " + ", ".join(f"{src} {n} pages {sec:.1f}s" for src, (n, sec) in sorted(tally.items())))
+
+
+def process_pdf(pdf):
+    log_path = page_log_path(pdf)
+    done = read_page_log(log_path)
+    if done:
+        print(f"resuming {pdf.name} after {len(done)} saved pages")
+
+    text_only = load_decisions(pdf)
+    doc = fitz.open(pdf)
+    with open(log_path, "a", encoding="utf-8") as log:
+        for i in range(len(doc)):
+            if i + 1 in done:
+                continue
+            append_page(log, read_page(doc[i], skip_ocr=i + 1 in text_only))
+    count = len(doc)
+    doc.close()
+
+    finish_pdf(pdf)
+    return count - len(done)
+
+
+# -----------------------------
+# Parallel OCR (pages spread across a process pool)
+# -----------------------------
+
+_worker_doc = {"path": None, "doc": None}
+
+
+def _init_worker(options):
+    # one tesseract thread per process, the pool provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    configure(**options)
+
+
+def _open_doc(pdf_path):
+    # each worker keeps a single document open and only reopens on a new file
+    if _worker_doc["path"] != pdf_path:
+        if _worker_doc["doc"] is not None:
+            _worker_doc["doc"].close()
+        _worker_doc["doc"] = fitz.open(pdf_path)
+        _worker_doc["path"] = pdf_path
+    return _worker_doc["doc"]
+
+
+def _ocr_pages(pdf_path, indices, text_only):
+    doc = _open_doc(pdf_path)
+    before = run_stats()
+    pages = [read_page(doc[i], skip_ocr=i + 1 in text_only) for i in indices]
+    after = run_stats()
+    return pages, {k: after[k] - before[k] for k in after}
+
+
+def process_pdfs_parallel(pdfs, workers, chunk_pages=CHUNK_PAGES, options=None, stats=None):
+    """
+    OCR many PDFs at once with small page ranges as the unit of work.
+    Finished pages are appended to each PDF's page log as they arrive and the
+    log is compacted once the PDF is complete. Pages already in a log from an
+    earlier run are not resubmitted.
+    `options` are the configure() arguments for each worker. Worker
+    run_stats() deltas are summed into `stats` when given.
+    Yields (pdf, pages_processed, error) as each PDF finishes.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(options or {},)) as pool:
+        futures = {}
+        pending = {}
+
+        for pdf in pdfs:
+            try:
+                with fitz.open(pdf) as doc:
+                    count = len(doc)
+            except Exception as e:
+                yield pdf, 0, e
+                continue
+
+            done = read_page_log(page_log_path(pdf))
+            if done:
+                print(f"resuming {pdf.name} after {len(done)} saved pages")
+
+            todo = [i for i in range(count) if i + 1 not in done]
+            text_only = load_decisions(pdf)
+            pending[pdf] = {"remaining": len(todo), "processed": len(todo)}
+
+            if not todo:
+                del pending[pdf]
+                finish_pdf(pdf)
+                yield pdf, 0, None
+                continue
+
+            for k in range(0, len(todo), chunk_pages):
+                indices = todo[k:k + chunk_pages]
+                fut = pool.submit(_ocr_pages, str(pdf), indices,
+                                  {i + 1 for i in indices if i + 1 in text_only})
+                futures[fut] = pdf
+
+        for fut in as_completed(futures):
+            pdf = futures[fut]
+            state = pending.get(pdf)
+            if state is None:
+                continue  # an earlier range of this pdf already failed
+
+            try:
+                pages, delta = fut.result()
+                if stats is not None:
+                    for k, v in delta.items():
+                        stats[k] += v
+                with open(page_log_path(pdf), "a", encoding="utf-8") as log:
+                    for page in pages:
+                        append_page(log, page)
+            except Exception as e:
+                del pending[pdf]
+                yield pdf, 0, e
+                continue
+
+            state["remaining"] -= len(pages)
+            if state["remaining"] == 0:
+                del pending[pdf]
+                finish_pdf(pdf)
+                yield pdf, state["processed"], None
+
+
 def main():
-    for pdf in input_dir.glob("*.pdf"):
+    parser = argparse.ArgumentParser(description="OCR well PDFs into per-page JSON")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="OCR processes, 0 = one per core (default: 1, serial)")
+    parser.add_argument("--chunk-pages", type=int, default=CHUNK_PAGES,
+                        help="pages per work unit in parallel mode")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_MB,
+                        help="size limit of the on-disk OCR cache")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always run tesseract, never read or write the OCR cache")
+    parser.add_argument("--otsu", action="store_true",
+                        help="pick the binarization threshold per page with Otsu's method")
+    parser.add_argument("--backend", default="auto", choices=["auto"] + list(BACKENDS),
+                        help="OCR engine, auto = tesserocr if installed else pytesseract")
+    args = parser.parse_args()
+
+    cache_file = None if args.no_cache else cache_path
+    backend = resolve_backend(args.backend)
+    options = {
+        "cache_file": cache_file,
+        "cache_mb": args.cache_mb,
+        "threshold": "otsu" if args.otsu else THRESHOLD,
+        "backend": backend
+    }
+
+    workers = args.workers or os.cpu_count()
+
+    todo = []
+    for pdf in sorted(input_dir.glob("*.pdf")):
         output_file = output_dir / f"{pdf.stem}.json"
 
         if output_file.exists():
             print(f"skipping (already extracted): {pdf.name}")
             continue
 
-        print(f"extracting pages from: {pdf.name}")
+        todo.append(pdf)
+
+    start = time.time()
+    total_pages = 0
+
+    if workers > 1:
+        print(f"extracting pages from {len(todo)} pdfs with {workers} workers")
+
+        configure(**options)  # the parent reads and writes the decision cache
+        stats = {"hits": 0, "misses": 0, "ocr_pages": 0, "ocr_seconds": 0.0}
+        results = process_pdfs_parallel(todo, workers, args.chunk_pages, options, stats)
+
+        for pdf, processed, error in results:
+            if error is not None:
+                print(f"failed: {pdf.name} — {error}")
+                continue
+            print(f"saved: {pdf.stem}.json ({processed} pages processed)")
+            total_pages += processed
+    else:
+        configure(**options)
+
+        for pdf in todo:
+            print(f"extracting pages from: {pdf.name}")
+
+            try:
+                processed = process_pdf(pdf)
+                print(f"saved: {pdf.stem}.json ({processed} pages processed)")
+                total_pages += processed
+
+            except Exception as e:
+                print(f"failed: {pdf.name} — {e}")
 
-        try:
-            pages = extract_pdf_pages(pdf)
+        stats = run_stats()
+        if _cache is not None:
+            _cache.close()
+        if _backend is not None:
+            _backend.close()
 
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(pages, f, indent=2)
+    elapsed = time.time() - start
+    if total_pages:
+        print(f"{total_pages} pages in {elapsed:.1f}s ({total_pages / elapsed:.2f} pages/sec)")
 
-            print(f"saved {len(pages)} pages: {output_file.name}")
+    if stats["ocr_pages"]:
+        print(f"{backend}: {stats['ocr_pages']} pages OCR'd in {stats['ocr_seconds']:.1f}s of engine time "
+              f"({stats['ocr_pages'] / stats['ocr_seconds']:.2f} pages/sec per process)")
 
-        except Exception as e:
-            print(f"failed: {pdf.name} — {e}")
+    lookups = stats["hits"] + stats["misses"]
+    if cache_file and lookups:
+        print(f"ocr cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hits'] / lookups:.0%} hit rate)")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
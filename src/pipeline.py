@@ -0,0 +1,393 @@
+"""
+Incremental pipeline driver.
+
+Runs ocr -> filter -> score -> extract -> clean -> load -> geojson, rebuilding only what
+is stale. data/manifest.json records, per stage and per input file, the input
+content hash, the stage version (its source file and the helper modules that
+shape its output, plus the config constants and shared functions it depends
+on) and the hashes of the
+outputs it produced. An item is rebuilt when its input hash, the stage
+version, or one of its outputs is missing/different, or when its last run
+left part of it undone (an extract item whose segments failed validation).
+Because downstream inputs are upstream outputs, a rebuild that produces
+identical bytes stops there. Outputs of inputs that were deleted are
+deleted too, so they do not flow on into load and geojson.
+
+File hashes are cached by (size, mtime) so an unchanged corpus is not re-read.
+
+  python pipeline.py --dry-run          # show what is stale
+  python pipeline.py                    # rebuild stale items
+  python pipeline.py --mark-done        # adopt existing outputs without running
+  python pipeline.py --stages filter extract
+
+The web scraper is not a stage: it depends on an external site rather than on
+files in this repo and is still run by hand between load and geojson.
+"""
+import ast
+import json
+import time
+import hashlib
+import argparse
+import importlib
+from pathlib import Path
+
+src = Path(__file__).resolve().parent
+base = src.parent
+data = base / "data"
+MANIFEST = data / "manifest.json"
+
+
+# -----------------------------
+# Stage definitions
+# -----------------------------
+
+_configured = set()
+
+
+def run_ocr(path):
+    ocr = importlib.import_module("ocr")
+    if "ocr" not in _configured:
+        ocr.configure()
+        _configured.add("ocr")
+    ocr.process_pdf(path)
+
+
+def run_filter(path):
+    importlib.import_module("filter_pages").process_file(path, force=True)
+
+
+def run_score(path):
+    importlib.import_module("score_segments").process_file(path)
+
+
+def open_llm_cache():
+    if "llm_cache" not in _configured:
+        importlib.import_module("llm_cache").open_cache()
+        _configured.add("llm_cache")
+
+
+def run_extract(path):
+    # the item is the relevance file; extraction reads the segments it was scored from
+    open_llm_cache()
+    segments = data / "segments" / f"{path.stem.replace('_relevance', '')}_segments.json"
+    # the number of segments that failed; they are retried on the next run
+    return importlib.import_module("extract_entities").process_file(segments)
+
+
+def run_clean(path):
+    open_llm_cache()
+    importlib.import_module("llm_clean_extraction").process_file(path, data / "final_outputs")
+
+
+def run_load(paths):
+    sql_db = importlib.import_module("sql_db")
+    sql_db.create_database()
+    sql_db.create_tables()
+    sql_db.insert_well_data()
+
+
+def run_geojson(paths):
+    importlib.import_module("build_geojson").build_geojson()
+
+
+STAGES = [
+    {
+        "name": "ocr",
+        "source": "ocr.py",
+        "helpers": ["disk_cache.py"],
+        # of filter_pages, OCR only uses the page features
+        "config": [("ocr.py", "OCR_CONFIG"), ("ocr.py", "TARGET_DPI"), ("ocr.py", "MIN_DPI"),
+                   ("ocr.py", "MAX_PIXELS"), ("ocr.py", "THRESHOLD"), ("ocr.py", "IMAGE_COVERAGE"),
+                   ("ocr.py", "TEXT_MIN_LEN"), ("ocr.py", "TEXT_ALPHA_RATIO"),
+                   ("ocr.py", "TEXT_SINGLE_CHAR_RATIO"), ("filter_pages.py", "_features"),
+                   ("filter_pages.py", "page_features")],
+        "inputs": (data / "original_pdfs", "*.pdf"),
+        "outputs": lambda p: [data / "ocr_json" / f"{p.stem}.json"],
+        "run": run_ocr,
+    },
+    {
+        "name": "filter",
+        "source": "filter_pages.py",
+        "helpers": ["segment_store.py"],
+        "config": [("filter_pages.py", "MIN_LEN"), ("filter_pages.py", "ALPHA_RATIO"),
+                   ("filter_pages.py", "SINGLE_CHAR_RATIO"), ("filter_pages.py", "FORM_PATTERNS")],
+        "inputs": (data / "ocr_json", "*.json"),
+        "outputs": lambda p: [data / "segments" / f"{p.stem}_segments.json"],
+        "run": run_filter,
+    },
+    {
+        "name": "score",
+        "source": "score_segments.py",
+        "helpers": ["header_rules.py", "segment_store.py"],
+        "config": [("score_segments.py", "FIELD_TERMS"), ("score_segments.py", "PATTERN_BONUS"),
+                   ("score_segments.py", "THRESHOLDS")],
+        "inputs": (data / "segments", "*_segments.json"),
+        "outputs": lambda p: [data / "relevance" / f"{p.stem.replace('_segments', '')}_relevance.json"],
+        "run": run_score,
+    },
+    {
+        "name": "extract",
+        "source": "extract_entities.py",
+        # the LLM transport (llm_backend, llm_cache, rate_limit) does not change what is extracted
+        "helpers": ["chunker.py", "header_rules.py", "segment_store.py"],
+        "config": [("extract_entities.py", "SYSTEM_PROMPT"), ("extract_entities.py", "RULE_CONFIDENCE"),
+                   ("extract_entities.py", "CHUNK_TOKENS"), ("extract_entities.py", "BATCH_SIZE"),
+                   ("extract_entities.py", "BATCH_PROMPT"), ("score_segments.py", "load_relevance")],
+        "inputs": (data / "relevance", "*_relevance.json"),
+        "outputs": lambda p: [data / "structured" / f"{p.stem.replace('_relevance', '')}_structured.json"],
+        "run": run_extract,
+        # a retry of an incomplete item keeps the saved segments and redoes the failed ones
+        "resumable": True,
+    },
+    {
+        "name": "clean",
+        "source": "llm_clean_extraction.py",
+        "helpers": ["header_rules.py", "stim_events.py"],
+        "config": [("llm_clean_extraction.py", "RECONCILE_PROMPT"), ("llm_clean_extraction.py", "FUZZY_MATCH"),
+                   ("llm_clean_extraction.py", "CONFLICT_RATIO"), ("llm_clean_extraction.py", "COORD_TOLERANCE"),
+                   ("llm_clean_extraction.py", "TOWNSHIP_TOLERANCE"), ("stim_events.py", "DEPTH_TOLERANCE"),
+                   ("stim_events.py", "VOLUME_TOLERANCE"), ("stim_events.py", "DATE_TOLERANCE"),
+                   ("stim_events.py", "FORMATION_MATCH"), ("stim_events.py", "MIN_SHARED")],
+        "inputs": (data / "structured", "*.json"),
+        "outputs": lambda p: [data / "final_outputs" / p.name],
+        "run": run_clean,
+    },
+    {
+        # whole-corpus stage: any changed final output reruns the loader, which only rewrites changed wells
+        "name": "load",
+        "source": "sql_db.py",
+        "helpers": ["migrations.py", "stim_events.py"],
+        "config": [],
+        "inputs": (data / "final_outputs", "*.json"),
+        "corpus": True,
+        "outputs": lambda paths: [],
+        "run": run_load,
+    },
+    {
+        "name": "geojson",
+        "source": "build_geojson.py",
+        "config": [],
+        "after": "load",
+        "corpus": True,
+        "outputs": lambda paths: [base / "www" / "data" / "wells.geojson"],
+        "run": run_geojson,
+    },
+]
+
+
+# -----------------------------
+# Fingerprints
+# -----------------------------
+
+def file_hash(path, manifest):
+    """sha256 of a file, reusing the manifest's cached value while size and mtime match."""
+    st = path.stat()
+    key = rel(path)
+    cached = manifest["files"].get(key)
+    if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+        return cached["sha256"]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+    manifest["files"][key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+
+def config_values(filename, names):
+    # read module-level constants (and the source of named functions) without
+    # importing the module and its API clients
+    source = (src / filename).read_text(encoding="utf-8")
+    tree = ast.parse(source)
+    values = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in names:
+                    values[target.id] = ast.get_source_segment(source, node.value)
+        elif isinstance(node, ast.FunctionDef) and node.name in names:
+            values[node.name] = ast.get_source_segment(source, node)
+    return values
+
+
+def stage_version(stage):
+    config = hashlib.sha256()
+    for filename, name in stage["config"]:
+        config.update(f"{filename}:{name}={config_values(filename, [name]).get(name)}".encode())
+    # helpers count as the stage's code: a change to segment_store or chunker reruns it too
+    code = hashlib.sha256()
+    for filename in [stage["source"]] + stage.get("helpers", []):
+        code.update(f"{filename}:{hashlib.sha256((src / filename).read_bytes()).hexdigest()}\n".encode())
+    return {
+        "code": code.hexdigest(),
+        "config": config.hexdigest()
+    }
+
+
+def same_version(recorded, current, trust_code=False):
+    if not recorded or recorded.get("config") != current["config"]:
+        return False
+    return trust_code or recorded.get("code") == current["code"]
+
+
+def rel(path):
+    return str(Path(path).resolve().relative_to(base))
+
+
+def combine(hashes):
+    return hashlib.sha256("\n".join(sorted(hashes)).encode()).hexdigest()
+
+
+# -----------------------------
+# Manifest
+# -----------------------------
+
+def load_manifest():
+    if MANIFEST.exists():
+        return json.loads(MANIFEST.read_text(encoding="utf-8"))
+    return {"files": {}, "stages": {}}
+
+
+def save_manifest(manifest):
+    tmp = MANIFEST.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(MANIFEST)
+
+
+def outputs_fresh(entry, outputs, manifest):
+    if set(entry.get("outputs", {})) != {rel(o) for o in outputs}:
+        return False
+    for out in outputs:
+        if not out.exists() or file_hash(out, manifest) != entry["outputs"][rel(out)]:
+            return False
+    return True
+
+
+def plan_stage(stage, manifest, trust_code=False):
+    """Return (version, entries, items) where items are (key, inputs, input_hash, outputs, stale)."""
+    version = stage_version(stage)
+    record = manifest["stages"].get(stage["name"], {})
+    entries = record.get("items", {}) if same_version(record.get("version"), version, trust_code) else {}
+
+    if "after" in stage:
+        # depends on what the upstream stage last ran with, not on files
+        upstream = manifest["stages"].get(stage["after"], {})
+        input_hash = combine([json.dumps(upstream.get("version"), sort_keys=True)] +
+                             [e["input"] for e in upstream.get("items", {}).values()])
+        items = [("*", [], input_hash)]
+    else:
+        folder, pattern = stage["inputs"]
+        paths = sorted(folder.glob(pattern))
+        if stage.get("corpus"):
+            items = [("*", paths, combine(file_hash(p, manifest) for p in paths))]
+        else:
+            items = [(rel(p), p, file_hash(p, manifest)) for p in paths]
+
+    plan = []
+    for key, inputs, input_hash in items:
+        outputs = stage["outputs"](inputs)
+        entry = entries.get(key)
+        stale = (entry is None or entry["input"] != input_hash or entry.get("incomplete")
+                 or not outputs_fresh(entry, outputs, manifest))
+        plan.append((key, inputs, input_hash, outputs, stale))
+    return version, entries, plan
+
+
+def prune_removed(stage, manifest, plan, dry_run=False):
+    """Delete the outputs of items whose input file is gone (whatever version recorded them)."""
+    current = {key for key, *_ in plan}
+    keep = {rel(o) for *_, outputs, _ in plan for o in outputs}
+    recorded = manifest["stages"].get(stage["name"], {}).get("items", {})
+    for key, entry in recorded.items():
+        if key in current:
+            continue
+        print(f"  input removed: {key}")
+        for out in entry.get("outputs", {}):
+            if out in keep or dry_run:
+                continue
+            (base / out).unlink(missing_ok=True)
+            manifest["files"].pop(out, None)
+        manifest["files"].pop(key, None)
+
+
+def run_stage(stage, manifest, dry_run=False, mark_done=False, trust_code=False):
+    version, old, plan = plan_stage(stage, manifest, trust_code)
+    items = {}
+
+    stale = [item for item in plan if item[4]]
+    print(f"[{stage['name']}] {len(plan) - len(stale)} up to date, {len(stale)} stale")
+    if not stage.get("corpus") and "after" not in stage:
+        prune_removed(stage, manifest, plan, dry_run)
+
+    for key, inputs, input_hash, outputs, is_stale in plan:
+        if not is_stale:
+            items[key] = old[key]
+            continue
+
+        if dry_run:
+            print(f"  stale: {key}")
+            continue
+
+        failed = 0
+        if not mark_done:
+            print(f"  rebuilding: {key}")
+            start = time.time()
+            entry = old.get(key, {})
+            resume = stage.get("resumable") and entry.get("incomplete") and entry["input"] == input_hash
+            for out in outputs:
+                if out.exists() and not resume:
+                    out.unlink()
+            try:
+                failed = stage["run"](inputs) or 0
+            except Exception as e:
+                print(f"  failed: {key} — {e}")
+                continue
+            print(f"  done in {time.time() - start:.1f}s")
+
+        if any(not out.exists() for out in outputs):
+            print(f"  no output for {key}, will retry next run")
+            continue
+
+        items[key] = {
+            "input": input_hash,
+            "outputs": {rel(o): file_hash(o, manifest) for o in outputs}
+        }
+        if failed:
+            # kept so the finished part is not redone, but stale until nothing fails
+            items[key]["incomplete"] = failed
+            print(f"  {failed} parts of {key} failed, will retry next run")
+
+    if not dry_run:
+        manifest["stages"][stage["name"]] = {"version": version, "items": items}
+        save_manifest(manifest)
+
+
+def main():
+    names = [s["name"] for s in STAGES]
+    parser = argparse.ArgumentParser(description="run the pipeline, rebuilding only stale artifacts")
+    parser.add_argument("--stages", nargs="+", choices=names, default=names)
+    parser.add_argument("--dry-run", action="store_true", help="only report stale items")
+    parser.add_argument("--mark-done", action="store_true",
+                        help="record existing outputs as up to date without running anything")
+    parser.add_argument("--trust-code", action="store_true",
+                        help="only config constants, not source edits, invalidate a stage")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    start = time.time()
+
+    for stage in STAGES:
+        if stage["name"] in args.stages:
+            run_stage(stage, manifest, args.dry_run, args.mark_done, args.trust_code)
+
+    if not args.dry_run:
+        save_manifest(manifest)
+    if "llm_cache" in _configured:
+        importlib.import_module("llm_cache").report()
+    print(f"pipeline finished in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import re
+import time
+import threading
+
+
+def retry_hint(message):
+    """Seconds from an API error like '... Please retry in 12.3s', or None."""
+    match = re.search(r"retry in (\d+\.?\d*)s", str(message))
+    return float(match.group(1)) if match else None
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """
+    Token buckets for requests per minute and (optionally) tokens per minute,
+    shared by every thread making API calls.
+
+    acquire(tokens) blocks until both buckets allow the call. When the server
+    still pushes back, pause() holds all callers until its "retry in Xs" has
+    passed and the allowed rate is cut; it creeps back up on each success.
+    A limit of 0 (or None) means unlimited.
+    """
+
+    def __init__(self, rpm, tpm=None, min_fraction=0.1):
+        if (rpm or 0) < 0 or (tpm or 0) < 0:
+            raise ValueError(f"rate limits must be 0 (unlimited) or positive, got rpm={rpm} tpm={tpm}")
+        self.rpm = rpm or None
+        self.tpm = tpm or None
+        self.scale = 1.0
+        self.min_fraction = min_fraction
+        self.requests = float(rpm) if rpm else 0.0
+        self.tokens = float(tpm) if tpm else 0.0
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm * self.scale / 60)
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm * self.scale / 60)
+
+    def acquire(self, tokens=0):
+        if self.tpm:
+            tokens = min(tokens, self.tpm)  # a single oversized call still has to go through
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif (not self.rpm or self.requests >= 1) and (not self.tpm or self.tokens >= tokens):
+                    if self.rpm:
+                        self.requests -= 1
+                    if self.tpm:
+                        self.tokens -= tokens
+                    return
+                else:
+                    need_req = 0.0
+                    if self.rpm:
+                        need_req = max(0.0, 1 - self.requests) * 60 / (self.rpm * self.scale)
+                    need_tok = 0.0
+                    if self.tpm:
+                        need_tok = max(0.0, tokens - self.tokens) * 60 / (self.tpm * self.scale)
+                    wait = max(need_req, need_tok, 0.01)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.scale = max(self.min_fraction, self.scale * 0.75)
+
+    def success(self):
+        with self.lock:
+            self.scale = min(1.0, self.scale + 0.02)
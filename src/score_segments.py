@@ -0,0 +1,143 @@
+import re
+import json
+import math
+import hashlib
+from collections import Counter
+from pathlib import Path
+from segment_store import SegmentReader
+from header_rules import API_RE, LAT_DMS_RE, LAT_RE, STIMULATION_RE
+
+base = Path(__file__).resolve().parent.parent
+INPUT = base / "data" / "segments"
+OUT = base / "data" / "relevance"
+
+# -----------------------------
+# Per-field relevance of segments to the OilWell schema
+#
+# Each field has a small vocabulary. A segment's score for a field is the
+# TF-IDF mass of that vocabulary in its text (IDF over the segments of the
+# same well, so letterhead boilerplate repeated on every page counts less)
+# plus a bonus when the field's own pattern matches. A segment below every
+# field threshold is not sent to the LLM.
+# -----------------------------
+
+FIELD_TERMS = {
+    "api_number": {"api": 2.0, "file": 0.5, "permit": 0.5},
+    "well_name": {"well": 0.5, "name": 1.0, "lease": 1.0, "federal": 0.5, "number": 0.5},
+    "operator": {"operator": 2.0, "company": 0.5, "petroleum": 0.5, "energy": 0.5, "resources": 0.5,
+                 "llc": 0.5, "inc": 0.5, "corporation": 0.5},
+    "location": {"county": 1.0, "township": 1.5, "range": 1.0, "section": 1.0, "sec": 1.0, "twp": 1.5,
+                 "rng": 1.5, "qtr": 1.0, "footages": 1.5, "fnl": 1.0, "fsl": 1.0, "fel": 1.0, "fwl": 1.0},
+    "coordinates": {"latitude": 2.0, "longitude": 2.0, "lat": 1.0, "long": 0.5, "nad": 1.5, "datum": 1.0},
+    "stimulation": {"stimulated": 2.0, "stimulation": 2.0, "frac": 1.5, "fracture": 1.0, "proppant": 2.0,
+                    "sand": 0.5, "acid": 1.5, "acidized": 1.5, "treatment": 1.0, "stages": 1.0,
+                    "perforated": 1.0, "perfs": 1.0, "psi": 0.5, "mesh": 1.5, "bbls": 0.5, "gal": 0.5},
+}
+FIELD_PATTERNS = {
+    "api_number": API_RE,
+    "coordinates": re.compile(f"{LAT_DMS_RE.pattern}|{LAT_RE.pattern}", re.I),
+    "stimulation": STIMULATION_RE,
+}
+PATTERN_BONUS = 2.0
+# a segment is sent to the LLM when any field reaches its threshold
+THRESHOLDS = {
+    "api_number": 2.0,
+    "well_name": 1.5,
+    "operator": 2.0,
+    "location": 2.0,
+    "coordinates": 2.0,
+    "stimulation": 2.0,
+}
+TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def term_counts(text):
+    return Counter(TOKEN_RE.findall(text.lower()))
+
+
+def inverse_document_frequency(counts):
+    # smoothed idf, never below 1 so a term on every page still counts once
+    n = len(counts)
+    df = Counter(term for c in counts for term in c)
+    return {term: math.log((n + 1) / (df[term] + 1)) + 1 for term in df}
+
+
+def field_scores(text, counts, idf):
+    scores = {}
+    for field, terms in FIELD_TERMS.items():
+        score = sum(w * (1 + math.log(counts[t])) * idf[t] for t, w in terms.items() if counts[t])
+        pattern = FIELD_PATTERNS.get(field)
+        if pattern is not None and pattern.search(text):
+            score += PATTERN_BONUS
+        scores[field] = round(score, 3)
+    return scores
+
+
+def is_relevant(scores):
+    return any(scores[field] >= THRESHOLDS[field] for field in THRESHOLDS)
+
+
+def score_segments(texts):
+    """texts: {segment_id: text}. Returns one score record per segment."""
+    counts = {seg_id: term_counts(t) for seg_id, t in texts.items()}
+    idf = inverse_document_frequency(list(counts.values()))
+
+    records = []
+    for seg_id, text in texts.items():
+        scores = field_scores(text, counts[seg_id], idf)
+        records.append({
+            "segment_id": seg_id,
+            "fields": scores,
+            "score": max(scores.values()),
+            "relevant": is_relevant(scores)
+        })
+    return records
+
+
+def relevance_path(segments_path):
+    return OUT / f"{Path(segments_path).stem.replace('_segments', '')}_relevance.json"
+
+
+def load_relevance(segments_path):
+    """{segment_id: record} for a segments file, or None if it was not scored (or is stale)."""
+    path = relevance_path(segments_path)
+    if not path.exists():
+        return None
+    relevance = json.loads(path.read_text(encoding="utf-8"))
+    if relevance["segments_sha256"] != hashlib.sha256(Path(segments_path).read_bytes()).hexdigest():
+        print(f"  {path.name} is older than {Path(segments_path).name}, ignoring it")
+        return None
+    return {r["segment_id"]: r for r in relevance["scores"]}
+
+
+def process_file(path):
+    raw = path.read_bytes()
+    segments = json.loads(raw)
+    reader = SegmentReader()
+    texts = {s["segment_id"]: reader.text(s) for s in segments}
+    reader.close()
+
+    records = score_segments(texts)
+    out = relevance_path(path)
+    OUT.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "segments": path.name,
+        "segments_sha256": hashlib.sha256(raw).hexdigest(),
+        "scores": records
+    }, indent=2), encoding="utf-8")
+
+    skipped = sum(not r["relevant"] for r in records)
+    print(f"{path.name}: {len(records) - skipped} relevant, {skipped} skipped -> {out.name}")
+
+
+def main():
+    files = sorted(INPUT.glob("*_segments.json"))
+    if not files:
+        print("no input files in", INPUT)
+        return
+    for f in files:
+        process_file(f)
+
+
+if __name__ == "__main__":
+    main()
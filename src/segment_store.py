@@ -0,0 +1,119 @@
+import json
+import mmap
+import hashlib
+from pathlib import Path
+
+base = Path(__file__).resolve().parent.parent
+OCR_DIR = base / "data" / "ocr_json"
+
+# -----------------------------
+# Compact segments: page spans into data/ocr_json instead of copied text
+#
+#   {"segment_id": 1, "page_numbers": [1, 2], "source": "W11745.json",
+#    "source_size": 123456, "source_sha256": "9f2c...", "spans": [[2, 980], [984, 2010]]}
+#
+# Each span is the byte range of one page object in the OCR JSON array.
+# source_sha256 catches an OCR file rewritten at the same length, which
+# would otherwise hand back the wrong slices.
+# -----------------------------
+
+
+def load_pages(path):
+    """
+    Parse an OCR JSON array and return (pages, spans) where spans[i] is the
+    [start, end) byte range of pages[i] in the file.
+    """
+    return parse_pages(Path(path).read_bytes())
+
+
+def load_source(path):
+    """(pages, spans, sha256 of the file) from a single read."""
+    raw = Path(path).read_bytes()
+    pages, spans = parse_pages(raw)
+    return pages, spans, hashlib.sha256(raw).hexdigest()
+
+
+def parse_pages(raw):
+    text = raw.decode("utf-8")
+    ascii_only = len(raw) == len(text)  # json.dump escapes non-ASCII by default
+    decoder = json.JSONDecoder()
+
+    pages, spans = [], []
+    i = text.index("[") + 1
+    byte_pos, char_pos = 0, 0
+
+    def to_bytes(ci):
+        nonlocal byte_pos, char_pos
+        if ascii_only:
+            return ci
+        byte_pos += len(text[char_pos:ci].encode("utf-8"))
+        char_pos = ci
+        return byte_pos
+
+    while True:
+        while text[i] in " \t\r\n,":
+            i += 1
+        if text[i] == "]":
+            break
+        page, end = decoder.raw_decode(text, i)
+        pages.append(page)
+        spans.append([to_bytes(i), to_bytes(end)])
+        i = end
+
+    return pages, spans
+
+
+def compact_segment(segment, spans_by_page, source, source_size, source_sha256):
+    return {
+        "segment_id": segment["segment_id"],
+        "page_numbers": segment["page_numbers"],
+        "source": source,
+        "source_size": source_size,
+        "source_sha256": source_sha256,
+        "spans": [spans_by_page[n] for n in segment["page_numbers"]]
+    }
+
+
+class SegmentReader:
+    """
+    Reads segment text on demand. OCR files are memory-mapped once and only
+    the page objects a segment points at are decoded. Segments written in the
+    old format (with an inline "text" field) are returned as they are.
+    """
+
+    def __init__(self, ocr_dir=OCR_DIR):
+        self.ocr_dir = Path(ocr_dir)
+        self._files = {}
+        self._digests = {}
+
+    def _map(self, source, expected_size, expected_sha256=None):
+        if source not in self._files:
+            f = open(self.ocr_dir / source, "rb")
+            self._files[source] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        mm = self._files[source][1]
+        if expected_size is not None and len(mm) != expected_size:
+            raise ValueError(f"{source} changed since segments were built, re-run filter_pages.py")
+        if expected_sha256 is not None:
+            # hashed once per file, however many segments point into it
+            if source not in self._digests:
+                self._digests[source] = hashlib.sha256(mm).hexdigest()
+            if self._digests[source] != expected_sha256:
+                raise ValueError(f"{source} changed since segments were built, re-run filter_pages.py")
+        return mm
+
+    def pages(self, segment):
+        """Page texts of a segment; old-format segments come back as one page."""
+        if "text" in segment:
+            return [segment["text"]]
+        mm = self._map(segment["source"], segment.get("source_size"), segment.get("source_sha256"))
+        return [json.loads(mm[start:end])["text"] for start, end in segment["spans"]]
+
+    def text(self, segment):
+        return "\n\n".join(self.pages(segment))
+
+    def close(self):
+        for f, mm in self._files.values():
+            mm.close()
+            f.close()
+        self._files = {}
+        self._digests = {}
@@ -1,40 +1,36 @@
-import mysql.connector
 from mysql.connector import Error
 import json
+import hashlib
+import argparse
 from pathlib import Path
+from stim_events import dedupe_events, stimulation_date
+import db
+import migrations
+
+base = Path(__file__).resolve().parent.parent
+INPUT = base / "data" / "final_outputs"
 
 # -----------------------------
 # Functions to create MySQL database and appropriate tables
 # -----------------------------
 
-def create_database():
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="devuser",
-        password=""
-    )
+def create_database(rebuild=False):
+    """Create the database if needed; rebuild=True drops it first (and the scraped columns with it)."""
+    connection = db.server_connection()
 
     cursor = connection.cursor()
-    cursor.execute("DROP DATABASE IF EXISTS oil_wells_db;")
-    cursor.execute("CREATE DATABASE oil_wells_db;")
-    print("Database created (or exists).")
+    if rebuild:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{db.DB_NAME}`;")
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db.DB_NAME}`;")
+    print("Database rebuilt." if rebuild else "Database created (or exists).")
 
     cursor.close()
     connection.close()
 
 
-def create_tables():
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="devuser",
-        password="",
-        database="oil_wells_db"
-    )
-
-    cursor = connection.cursor()
-
+TABLES = [
     # Wells table
-    cursor.execute("""
+    """
     CREATE TABLE IF NOT EXISTS wells (
         api_number VARCHAR(20) PRIMARY KEY,
         well_name VARCHAR(255),
@@ -44,10 +40,10 @@ def create_tables():
         latitude DECIMAL(10,6),
         longitude DECIMAL(10,6)
     );
-    """)
+    """,
 
     # Stimulation events table
-    cursor.execute("""
+    """
     CREATE TABLE IF NOT EXISTS stimulation_events (
     id INT AUTO_INCREMENT PRIMARY KEY,
     api_number VARCHAR(20),
@@ -65,10 +61,10 @@ def create_tables():
     FOREIGN KEY (api_number) REFERENCES wells(api_number)
         ON DELETE CASCADE
     );
-    """)
+    """,
 
     # Proppant details table
-    cursor.execute("""
+    """
     CREATE TABLE IF NOT EXISTS proppant_details (
         id INT AUTO_INCREMENT PRIMARY KEY,
         stimulation_event_id INT,
@@ -77,10 +73,34 @@ def create_tables():
         FOREIGN KEY (stimulation_event_id) REFERENCES stimulation_events(id)
             ON DELETE CASCADE
     );
-    """)
+    """,
+
+    # Content hash of the final output each well was last loaded from
+    """
+    CREATE TABLE IF NOT EXISTS well_hashes (
+        api_number VARCHAR(20) PRIMARY KEY,
+        content_sha256 CHAR(64) NOT NULL,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (api_number) REFERENCES wells(api_number)
+            ON DELETE CASCADE
+    );
+    """,
+]
+
+
+def create_tables():
+    connection = db.connect()
+
+    cursor = connection.cursor()
+
+    for statement in TABLES:
+        cursor.execute(statement)
 
     connection.commit()
     cursor.close()
+
+    # the loaders below write the columns later migrations add
+    migrations.migrate(connection)
     connection.close()
 
     print("Tables created successfully.")
@@ -90,100 +110,284 @@ def create_tables():
 # Functions to insert data into MySQL database
 # -----------------------------
 
+WELL_SQL = """
+    INSERT INTO wells (
+        api_number, well_name, operator, county,
+        township_range, latitude, longitude
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        well_name=VALUES(well_name),
+        operator=VALUES(operator),
+        county=VALUES(county),
+        township_range=VALUES(township_range),
+        latitude=VALUES(latitude),
+        longitude=VALUES(longitude)
+"""
+
+EVENT_COLUMNS = [
+    "date_stimulated", "formation", "top_ft", "bottom_ft", "stages", "total_volume",
+    "volume_units", "acid_percent", "lbs_proppant", "max_pressure_psi", "max_rate_bbl_per_min"
+]
+# added by migration 2, parsed from date_stimulated
+DATE_COLUMNS = ["stimulated_on", "date_precision"]
+EVENT_SQL = f"""
+    INSERT INTO stimulation_events (
+        api_number, {", ".join(EVENT_COLUMNS + DATE_COLUMNS)}
+    ) VALUES ({", ".join(["%s"] * (len(EVENT_COLUMNS + DATE_COLUMNS) + 1))})
+"""
+# bulk mode assigns event ids itself so proppant rows can reference them without lastrowid
+EVENT_WITH_ID_SQL = f"""
+    INSERT INTO stimulation_events (
+        id, api_number, {", ".join(EVENT_COLUMNS + DATE_COLUMNS)}
+    ) VALUES ({", ".join(["%s"] * (len(EVENT_COLUMNS + DATE_COLUMNS) + 2))})
+"""
+PROPPANT_SQL = """
+    INSERT INTO proppant_details (
+        stimulation_event_id, type, volume
+    ) VALUES (%s, %s, %s)
+"""
+HASH_SQL = """
+    INSERT INTO well_hashes (api_number, content_sha256) VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE content_sha256=VALUES(content_sha256)
+"""
 
-def insert_well_data():
-    data_folder = Path("../data/final_outputs")
+BATCH_SIZE = 1000       # rows per executemany (mysql.connector sends them as one multi-row INSERT)
+COMMIT_WELLS = 5000     # wells per transaction in bulk mode
 
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="devuser",
-        password="",
-        database="oil_wells_db"
+
+def well_row(well):
+    return (
+        well["api_number"],
+        well["well_name"],
+        well["operator"],
+        well["county"],
+        well["township_range"],
+        well["latitude"],
+        well["longitude"]
     )
 
-    cursor = connection.cursor()
 
-    for file in data_folder.glob("*.json"):
-        print(f"Inserting: {file.name}")
+def event_row(api_number, event):
+    return ((api_number,) + tuple(event.get(column) for column in EVENT_COLUMNS)
+            + stimulation_date(event.get("date_stimulated")))
 
+
+def read_wells(data_folder=INPUT):
+    """
+    Final outputs that can be loaded (the api_number is the primary key).
+    Files that share an api_number (the same well scanned twice) become one
+    well: later files fill in header fields, and their events are added and
+    deduplicated.
+    """
+    wells = {}
+    for file in sorted(data_folder.glob("*.json")):
         with open(file, "r", encoding="utf-8") as f:
             well = json.load(f)
-        if well.get("api_number"):
-            # Insert well
-            cursor.execute("""
-                INSERT INTO wells (
-                    api_number, well_name, operator, county,
-                    township_range, latitude, longitude
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    well_name=VALUES(well_name),
-                    operator=VALUES(operator),
-                    county=VALUES(county),
-                    township_range=VALUES(township_range),
-                    latitude=VALUES(latitude),
-                    longitude=VALUES(longitude)
-            """, (
-                well["api_number"],
-                well["well_name"],
-                well["operator"],
-                well["county"],
-                well["township_range"],
-                well["latitude"],
-                well["longitude"]
-            ))
-
-            # Insert stimulation events
-            for event in well.get("stimulation_events", []):
-
-                date_value = event.get("date_stimulated")
-
-                cursor.execute("""
-                    INSERT INTO stimulation_events (
-                        api_number, date_stimulated, formation,
-                        top_ft, bottom_ft, stages,
-                        total_volume, volume_units, acid_percent,
-                        lbs_proppant, max_pressure_psi,
-                        max_rate_bbl_per_min
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    well["api_number"],
-                    date_value,
-                    event.get("formation"),
-                    event.get("top_ft"),
-                    event.get("bottom_ft"),
-                    event.get("stages"),
-                    event.get("total_volume"),
-                    event.get("volume_units"),
-                    event.get("acid_percent"),
-                    event.get("lbs_proppant"),
-                    event.get("max_pressure_psi"),
-                    event.get("max_rate_bbl_per_min")
-                ))
+        if not well.get("api_number"):
+            continue
 
-                stimulation_event_id = cursor.lastrowid
-
-                # Insert proppant breakdown
-                for detail in event.get("proppant_breakdown", []):
-                    cursor.execute("""
-                        INSERT INTO proppant_details (
-                            stimulation_event_id, type, volume
-                        ) VALUES (%s, %s, %s)
-                    """, (
-                        stimulation_event_id,
-                        detail.get("type"),
-                        detail.get("volume")
-                    ))
-        else:
+        existing = wells.get(well["api_number"])
+        if existing is None:
+            wells[well["api_number"]] = well
             continue
+        for key, value in well.items():
+            if key == "stimulation_events":
+                existing[key] = dedupe_events((existing.get(key) or []) + (value or []))
+            elif value is not None:
+                existing[key] = value
+    return list(wells.values())
+
+
+def well_hash(well):
+    return hashlib.sha256(json.dumps(well, sort_keys=True).encode()).hexdigest()
+
+
+def event_rows(well, next_id):
+    """(event rows, proppant rows, next free id) for a well, with event ids assigned from next_id."""
+    events, proppants = [], []
+    for event in well.get("stimulation_events") or []:
+        events.append((next_id,) + event_row(well["api_number"], event))
+        for detail in event.get("proppant_breakdown") or []:
+            proppants.append((next_id, detail.get("type"), detail.get("volume")))
+        next_id += 1
+    return events, proppants, next_id
+
+
+def next_event_id(cursor):
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM stimulation_events")
+    return cursor.fetchone()[0] + 1
+
+
+def insert_wells_row_by_row(connection, wells):
+    """One statement per well, event and proppant row; lastrowid links proppant rows to events."""
+    cursor = connection.cursor()
+    count = 0
+
+    for well in wells:
+        # Insert well
+        cursor.execute(WELL_SQL, well_row(well))
+
+        # Insert stimulation events
+        for event in well.get("stimulation_events") or []:
+            cursor.execute(EVENT_SQL, event_row(well["api_number"], event))
+
+            stimulation_event_id = cursor.lastrowid
+
+            # Insert proppant breakdown
+            for detail in event.get("proppant_breakdown") or []:
+                cursor.execute(PROPPANT_SQL, (
+                    stimulation_event_id,
+                    detail.get("type"),
+                    detail.get("volume")
+                ))
+        cursor.execute(HASH_SQL, (well["api_number"], well_hash(well)))
+        count += 1
 
     connection.commit()
     cursor.close()
+    return count
+
+
+def insert_rows(cursor, sql, rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[i:i + batch_size])
+
+
+def bulk_load_wells(connection, wells, batch_size=BATCH_SIZE, commit_wells=COMMIT_WELLS):
+    """
+    Load wells with multi-row INSERTs, committing every `commit_wells` wells.
+
+    Event ids are assigned here, continuing from the current MAX(id), so the
+    proppant rows can be built before anything is sent. This assumes nothing
+    else writes stimulation_events during the load. Meant for an empty
+    database: the events of wells already loaded would be inserted twice.
+    """
+    cursor = connection.cursor()
+    next_id = next_event_id(cursor)
+
+    well_rows, all_events, all_proppants, hash_rows = [], [], [], []
+    totals = {"wells": 0, "events": 0, "proppant": 0}
+
+    def flush():
+        # parents first, so the foreign keys hold inside the transaction
+        insert_rows(cursor, WELL_SQL, well_rows, batch_size)
+        insert_rows(cursor, EVENT_WITH_ID_SQL, all_events, batch_size)
+        insert_rows(cursor, PROPPANT_SQL, all_proppants, batch_size)
+        insert_rows(cursor, HASH_SQL, hash_rows, batch_size)
+        connection.commit()
+        totals["wells"] += len(well_rows)
+        totals["events"] += len(all_events)
+        totals["proppant"] += len(all_proppants)
+        for rows in (well_rows, all_events, all_proppants, hash_rows):
+            rows.clear()
+
+    for well in wells:
+        well_rows.append(well_row(well))
+        events, proppants, next_id = event_rows(well, next_id)
+        all_events.extend(events)
+        all_proppants.extend(proppants)
+        hash_rows.append((well["api_number"], well_hash(well)))
+
+        if len(well_rows) >= commit_wells:
+            flush()
+    flush()
+
+    cursor.close()
+    return totals
+
+
+def upsert_wells(connection, wells):
+    """
+    Reload only the wells whose content hash changed since they were last loaded.
+    Each changed well is replaced in its own transaction: the well row is
+    upserted (scraped columns are kept) and its events and proppant rows are
+    deleted and inserted again. A well without a hash row (loaded before
+    well_hashes existed) counts as changed, so its old events are replaced,
+    not duplicated. Wells whose final output is gone are deleted.
+    Returns (changed, unchanged, removed).
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT api_number, content_sha256 FROM well_hashes")
+    loaded = dict(cursor.fetchall())
+    next_id = next_event_id(cursor)
+
+    changed = unchanged = 0
+    for well in wells:
+        content = well_hash(well)
+        if loaded.get(well["api_number"]) == content:
+            unchanged += 1
+            continue
+
+        events, proppants, next_id = event_rows(well, next_id)
+        try:
+            cursor.execute(WELL_SQL, well_row(well))
+            # proppant_details go with their events (ON DELETE CASCADE)
+            cursor.execute("DELETE FROM stimulation_events WHERE api_number = %s", (well["api_number"],))
+            if events:
+                cursor.executemany(EVENT_WITH_ID_SQL, events)
+            if proppants:
+                cursor.executemany(PROPPANT_SQL, proppants)
+            cursor.execute(HASH_SQL, (well["api_number"], content))
+            connection.commit()
+            changed += 1
+        except Error as e:
+            connection.rollback()
+            print(f"Error loading {well['api_number']}: {e}")
+
+    removed = remove_missing_wells(connection, cursor, {well["api_number"] for well in wells})
+    cursor.close()
+    return changed, unchanged, removed
+
+
+def remove_missing_wells(connection, cursor, api_numbers):
+    """Delete wells (with their events, proppant and hash rows) that are not in api_numbers."""
+    # an empty or missing final_outputs folder is far more likely a mistake than an empty dataset
+    if not api_numbers:
+        return 0
+    cursor.execute("SELECT api_number FROM wells")
+    missing = [(row[0],) for row in cursor.fetchall() if row[0] not in api_numbers]
+    if missing:
+        cursor.executemany("DELETE FROM wells WHERE api_number = %s", missing)
+        connection.commit()
+    return len(missing)
+
+
+def insert_well_data(bulk=True, batch_size=BATCH_SIZE, incremental=True, data_folder=INPUT):
+    connection = db.connect()
+
+    wells = read_wells(data_folder)
+    if incremental:
+        # only an empty database is loaded in bulk: the bulk INSERTs would
+        # duplicate the events of wells already there (with or without hashes)
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1 FROM wells LIMIT 1")
+        incremental = cursor.fetchone() is not None
+        cursor.close()
+
+    if incremental:
+        changed, unchanged, removed = upsert_wells(connection, wells)
+        print(f"Reloaded {changed} changed wells, {unchanged} unchanged, removed {removed}.")
+    elif bulk:
+        totals = bulk_load_wells(connection, wells, batch_size)
+        print(f"Inserted {totals['wells']} wells, {totals['events']} stimulation events, "
+              f"{totals['proppant']} proppant rows.")
+    else:
+        insert_wells_row_by_row(connection, wells)
+
     connection.close()
 
     print("All data inserted successfully.")
 
 
 if __name__ == "__main__":
-    create_database()
+    parser = argparse.ArgumentParser(description="load final outputs into MySQL")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="drop the database (and the scraped columns) and load every well again")
+    parser.add_argument("--row-by-row", action="store_true",
+                        help="with --rebuild, one INSERT per row instead of batched multi-row INSERTs")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per multi-row INSERT")
+    args = parser.parse_args()
+
+    create_database(rebuild=args.rebuild)
     create_tables()
-    insert_well_data()
\ No newline at end of file
+    insert_well_data(bulk=not args.row_by_row, batch_size=args.batch_size, incremental=not args.rebuild)
\ No newline at end of file
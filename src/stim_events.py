@@ -0,0 +1,219 @@
+import re
+import difflib
+from datetime import date
+
+# -----------------------------
+# Stimulation event matching and deduplication
+#
+# The same frac job is usually reported on several forms (completion report,
+# sundry notice, the stimulation table itself), so the events appended from
+# every segment of a well repeat. Two events are the same job when their
+# date, formation, top/bottom depth and volume agree within tolerance on
+# every key both of them report, and they share at least MIN_SHARED such
+# keys. Duplicates are merged into one event, filling in missing fields.
+# -----------------------------
+
+DEPTH_TOLERANCE = 25      # feet between two readings of the same perforated interval
+VOLUME_TOLERANCE = 0.02   # relative difference between two readings of the same fluid volume
+DATE_TOLERANCE = 3        # days; OCR often garbles a single digit of the day
+FORMATION_MATCH = 0.8     # difflib ratio for two formation spellings to count as the same
+MIN_SHARED = 2            # keys both events must report before they can be called duplicates
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august",
+          "september", "october", "november", "december"]
+
+NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})\s*[/\-.]\s*(\d{1,2})\s*[/\-.]\s*(\d{2}|\d{4})\b")
+MONTH_YEAR_RE = re.compile(r"\b(\d{1,2})\s*/\s*(\d{4})\b")
+WORD_DATE_RE = re.compile(r"\b([A-Za-z][A-Za-z .]*?)\.?\s*(?:(\d{1,2})\s*,?\s*)?,?\s*(\d{4})\b")
+YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+
+FORMATION_ALIASES = {
+    "mb": "bakken",
+    "middle bakken": "bakken",
+    "3 forks": "three forks",
+    "tf": "three forks",
+}
+
+GALLONS_PER_BARREL = 42
+
+
+def full_year(year):
+    year = int(year)
+    if year < 100:
+        year += 2000 if year <= 30 else 1900
+    return year if 1900 <= year <= 2100 else None
+
+
+def month_number(word):
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if len(word) < 3:
+        return None  # "Ma" could be March or May
+    for i, name in enumerate(MONTHS):
+        if name.startswith(word):  # "Feb", "Sept", "July"
+            return i + 1
+    close = difflib.get_close_matches(word, MONTHS, n=1, cutoff=0.75)
+    return MONTHS.index(close[0]) + 1 if close else None
+
+
+def parse_date(value):
+    """
+    Normalize an OCR'd stimulation date to "YYYY-MM-DD", or "YYYY-MM" / "YYYY"
+    when that is all the text gives. Returns None when no year can be read.
+    """
+    if not value:
+        return None
+    text = str(value)
+
+    match = NUMERIC_DATE_RE.search(text)
+    if match:
+        month, day, year = int(match.group(1)), int(match.group(2)), full_year(match.group(3))
+        try:
+            if year:
+                return date(year, month, day).isoformat()
+        except ValueError:
+            pass
+
+    match = WORD_DATE_RE.search(text)
+    if match:
+        month, year = month_number(match.group(1)), full_year(match.group(3))
+        if month and year:
+            if match.group(2):
+                try:
+                    return date(year, month, int(match.group(2))).isoformat()
+                except ValueError:
+                    pass
+            return f"{year:04d}-{month:02d}"
+
+    match = MONTH_YEAR_RE.search(text)
+    if match and 1 <= int(match.group(1)) <= 12 and full_year(match.group(2)):
+        return f"{full_year(match.group(2)):04d}-{int(match.group(1)):02d}"
+
+    match = YEAR_RE.search(text)
+    return match.group(1) if match else None
+
+
+def stimulation_date(value):
+    """
+    (date, precision) for the DATE column: a "YYYY-MM" or "YYYY" result is
+    stored as its first day, with precision "month" or "year". (None, None)
+    when parse_date() cannot read a year.
+    """
+    parsed = parse_date(value)
+    if parsed is None:
+        return None, None
+    parts = [int(p) for p in parsed.split("-")]
+    precision = ["year", "month", "day"][len(parts) - 1]
+    return date(*(parts + [1] * (3 - len(parts)))), precision
+
+
+def normalize_formation(value):
+    if not value:
+        return None
+    name = re.sub(r"[^a-z0-9 ]", "", str(value).lower())
+    name = re.sub(r"\s+", " ", name).strip()
+    return FORMATION_ALIASES.get(name, name) or None
+
+
+def volume_barrels(event):
+    volume = event.get("total_volume")
+    if volume is None:
+        return None
+    units = re.sub(r"[^a-z]", "", str(event.get("volume_units") or "").lower())
+    return volume / GALLONS_PER_BARREL if units.startswith("gal") else volume
+
+
+# -----------------------------
+# Key comparisons: True / False when both events report the key, None otherwise
+# -----------------------------
+
+def dates_match(a, b):
+    if not a or not b:
+        return None
+    if a.startswith(b) or b.startswith(a):
+        return True  # "2015-03" and "2015-03-31" are the same report at different precision
+    if len(a) == len(b) == 10:
+        return abs((date.fromisoformat(a) - date.fromisoformat(b)).days) <= DATE_TOLERANCE
+    return False
+
+
+def formations_match(a, b):
+    if not a or not b:
+        return None
+    # "three forks" and "three forks second bench" are one formation
+    if a.startswith(b) or b.startswith(a):
+        return True
+    return difflib.SequenceMatcher(None, a, b).ratio() >= FORMATION_MATCH
+
+
+def depths_match(a, b):
+    if a is None or b is None:
+        return None
+    return abs(a - b) <= DEPTH_TOLERANCE
+
+
+def volumes_match(a, b):
+    if a is None or b is None:
+        return None
+    return abs(a - b) <= VOLUME_TOLERANCE * max(abs(a), abs(b), 1)
+
+
+def event_key(event):
+    return {
+        "date": parse_date(event.get("date_stimulated")),
+        "formation": normalize_formation(event.get("formation")),
+        "top_ft": event.get("top_ft"),
+        "bottom_ft": event.get("bottom_ft"),
+        "volume": volume_barrels(event),
+    }
+
+
+def same_event(a, b):
+    """a, b: event_key() results."""
+    checks = [
+        dates_match(a["date"], b["date"]),
+        formations_match(a["formation"], b["formation"]),
+        depths_match(a["top_ft"], b["top_ft"]),
+        depths_match(a["bottom_ft"], b["bottom_ft"]),
+        volumes_match(a["volume"], b["volume"]),
+    ]
+    if False in checks:
+        return False
+    shared = sum(c is True for c in checks)
+    # two events that report nothing are the same empty row
+    reported = [k for k in a if a[k] is not None or b[k] is not None]
+    return shared >= MIN_SHARED or not reported
+
+
+def completeness(event):
+    return sum(v not in (None, "", []) for v in event.values())
+
+
+def merge_event(kept, other):
+    """Fill the fields `kept` is missing from a duplicate of it."""
+    merged = dict(kept)
+    for name, value in other.items():
+        if merged.get(name) in (None, "", []) and value not in (None, "", []):
+            merged[name] = value
+    return merged
+
+
+def dedupe_events(events):
+    """
+    Collapse duplicate reports of the same job. The most complete report of
+    each job is kept, with missing fields taken from its duplicates, and
+    the events keep the order in which each job first appeared.
+    """
+    order = sorted(range(len(events)), key=lambda i: (-completeness(events[i]), i))
+    groups = []  # [first index, merged event, key of the kept report]
+
+    for i in order:
+        key = event_key(events[i])
+        for group in groups:
+            if same_event(group[2], key):
+                group[0] = min(group[0], i)
+                group[1] = merge_event(group[1], events[i])
+                break
+        else:
+            groups.append([i, dict(events[i]), key])
+
+    return [merged for _, merged, _ in sorted(groups, key=lambda g: g[0])]
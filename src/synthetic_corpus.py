@@ -0,0 +1,277 @@
+"""
+Synthetic corpus shaped like data/, for benchmarks at production scale.
+
+For each well it writes
+
+  ocr_json/W<n>.json                 OCR pages: NDIC form headers, continuation
+                                     pages, a stimulation table, and garbage pages
+  segments/W<n>_segments.json        compact segments, as filter_pages.py writes them
+  structured/W<n>_structured.json    per-segment LLM records with OCR-style noise
+  final_outputs/W<n>_structured.json the reconciled well (the ground truth)
+
+Everything is derived from Random(seed + n), so any range of wells can be
+generated on its own, in any process, and comes out the same.
+
+  python synthetic_corpus.py --wells 10000 --workers 0
+  python synthetic_corpus.py --wells 1000000 --pages 8 --out /scratch/corpus
+"""
+import os
+import json
+import random
+import hashlib
+import argparse
+import textwrap
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+base = Path(__file__).resolve().parent.parent
+OUT = base / "data" / "synthetic"
+
+PAGES_PER_WELL = 12     # the real corpus averages ~175, mostly continuation pages
+GARBAGE_RATE = 0.1      # share of pages that are blank scans or speckle
+NOISE_RATE = 0.02       # share of characters swapped for OCR look-alikes
+CHUNK_WELLS = 500       # wells per worker task
+
+FORMATIONS = ["Bakken", "Three Forks", "Red River", "Madison", "Dakota"]
+OPERATORS = ["OASIS PETROLEUM NORTH AMERICA LLC", "CONTINENTAL RESOURCES, INC.", "WHITING OIL AND GAS CORPORATION",
+             "HESS BAKKEN INVESTMENTS II, LLC", "XTO ENERGY INC."]
+COUNTIES = ["McKenzie", "Williams", "Mountrail", "Dunn", "Divide"]
+PROPPANTS = ["100 Mesh White", "40/70 White", "20/40 Ceramic", "30/50 White"]
+FILLER = ("the operator shall notify the commission of any change in well status casing cement tubing "
+          "packer perforations pressure test plug back depth drilling rig spud date surface location "
+          "bottom hole footages from section lines reserve pit reclamation production oil gas water "
+          "barrels per day gravity choke size flowing tubing pressure shut in date of first production").split()
+OCR_SWAPS = {"l": "1", "O": "0", "o": "0", "I": "|", "S": "5", "e": "c", "i": "1"}
+FORM_TITLES = ["SUNDRY NOTICES AND REPORTS ON WELLS - FORM 4", "WELL COMPLETION OR RECOMPLETION REPORT - FORM 6",
+               "AUTHORIZATION TO PURCHASE AND TRANSPORT OIL FROM LEASE - FORM 8"]
+
+
+# -----------------------------
+# Ground truth
+# -----------------------------
+
+def synthetic_well(i, rng):
+    """A well shaped like the final outputs, with a unique ND API number for i < 5,300,000."""
+    county_code = 1 + 2 * (i // 100000)
+    events = []
+    for _ in range(rng.randint(1, 4)):
+        top = rng.randint(9000, 11500)
+        events.append({
+            "date_stimulated": f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(2008, 2020)}",
+            "formation": rng.choice(FORMATIONS),
+            "top_ft": float(top),
+            "bottom_ft": float(top + rng.randint(5000, 10000)),
+            "stages": rng.randint(20, 50),
+            "total_volume": float(rng.randint(50000, 250000)),
+            "volume_units": "Barrels",
+            "acid_percent": None,
+            "lbs_proppant": float(rng.randint(2000000, 9000000)),
+            "max_pressure_psi": float(rng.randint(7000, 9500)),
+            "max_rate_bbl_per_min": round(rng.uniform(30, 80), 1),
+            "proppant_breakdown": [{"type": t, "volume": float(rng.randint(100000, 4000000))}
+                                   for t in rng.sample(PROPPANTS, rng.randint(0, 3))]
+        })
+    # latitude within the township, as llm_clean_extraction.township_latitude expects
+    township = rng.randint(140, 163)
+    return {
+        "api_number": f"33-{county_code:03d}-{i % 100000:05d}",
+        "well_name": f"Synthetic {i % 97} {i}H",
+        "operator": rng.choice(OPERATORS),
+        "county": rng.choice(COUNTIES),
+        "township_range": f"{township}N, {rng.randint(90, 104)}W",
+        "latitude": round(45.935 + (township - 128.5) * 0.0868 + rng.uniform(-0.04, 0.04), 6),
+        "longitude": round(rng.uniform(-104.0, -97.0), 6),
+        "stimulation_events": events
+    }
+
+
+# -----------------------------
+# Pages
+# -----------------------------
+
+def ocr_noise(text, rng):
+    return "".join(OCR_SWAPS[c] if c in OCR_SWAPS and rng.random() < NOISE_RATE else c for c in text)
+
+
+def filler(rng, words):
+    lines, line = [], []
+    for _ in range(words):
+        line.append(rng.choice(FILLER))
+        if len(line) == 10:
+            lines.append(" ".join(line))
+            line = []
+    lines.append(" ".join(line))
+    return ocr_noise("\n".join(lines), rng)
+
+
+def header_page(well, file_no, section, rng):
+    township, range_ = well["township_range"].replace(" ", "").split(",")
+    return (f"NORTH DAKOTA INDUSTRIAL COMMISSION\nOIL AND GAS DIVISION\nWell File No.\n{file_no}\n"
+            f"{rng.choice(FORM_TITLES)}\n"
+            f"Well Name and Number\n{well['well_name']}\n"
+            f"Operator\n{well['operator']}\n"
+            f"API No. {well['api_number']}\n"
+            f"County {well['county']}\nSection {section} Township {township} Range {range_}\n"
+            f"Latitude {well['latitude']} Longitude {well['longitude']}\n\n"
+            + filler(rng, rng.randint(60, 200)))
+
+
+def stimulation_page(well, rng):
+    lines = ["Date Stimulated | Stimulated Formation | Top (Ft) | Bottom (Ft) | Stimulation Stages | "
+             "Volume | Volume Units"]
+    for e in well["stimulation_events"]:
+        lines.append(f"{e['date_stimulated']} | {e['formation']} | {e['top_ft']:.0f} | {e['bottom_ft']:.0f} | "
+                     f"{e['stages']} | {e['total_volume']:.0f} | {e['volume_units']}")
+        lines.append(f"Type Treatment Sand Frac | Lbs Proppant {e['lbs_proppant']:.0f} | "
+                     f"Maximum Treatment Pressure (PSI) {e['max_pressure_psi']:.0f} | "
+                     f"Maximum Treatment Rate (BBLS/Min) {e['max_rate_bbl_per_min']}")
+        for d in e["proppant_breakdown"]:
+            lines.append(f"{d['type']}: {d['volume']:.0f}")
+    return "\n".join(lines) + "\n\n" + filler(rng, rng.randint(20, 80))
+
+
+def garbage_page(rng):
+    if rng.random() < 0.5:
+        return "\n".join(rng.choice(["", ".", "|", "~"]) for _ in range(rng.randint(1, 20)))
+    return " ".join(rng.choice("|.,;:~-_il1!'") for _ in range(rng.randint(200, 600)))
+
+
+def build_pages(well, n, pages_per_well, rng):
+    """
+    Pages of one well and the segments filter_pages.py makes of them:
+    returns (pages, [(segment page numbers, has stimulation table)]).
+    pages_per_well counts form pages; garbage pages come on top.
+    """
+    forms = max(1, pages_per_well // 4)
+    stim_form = rng.randrange(forms)
+    continuation = [0] * forms
+    for _ in range(max(0, pages_per_well - forms - 1)):
+        continuation[rng.randrange(forms)] += 1
+
+    texts, segments = [], []
+    for f in range(forms):
+        body = [header_page(well, 100000 + n, rng.randint(1, 36), rng)]
+        if f == stim_form:
+            body.append(stimulation_page(well, rng))
+        body += [filler(rng, rng.randint(80, 250)) for _ in range(continuation[f])]
+
+        numbers = []
+        for text in body:
+            # blank scans inside a form are dropped without splitting its segment
+            if numbers and rng.random() < GARBAGE_RATE:
+                texts.append(garbage_page(rng))
+            texts.append(text)
+            numbers.append(len(texts))
+        segments.append((numbers, f == stim_form))
+
+    pages = [{"page_number": i + 1, "text": t} for i, t in enumerate(texts)]
+    return pages, segments
+
+
+def dump_pages(pages):
+    """The OCR JSON text (as json.dump(indent=2) writes it) and each page's byte span in it."""
+    parts = [textwrap.indent(json.dumps(p, indent=2), "  ") for p in pages]
+    spans, offset = [], 2  # after "[\n"
+    for part in parts:
+        spans.append([offset + 2, offset + len(part)])
+        offset += len(part) + 2  # ",\n"
+    return "[\n" + ",\n".join(parts) + "\n]", spans
+
+
+# -----------------------------
+# Per-segment records with the noise the LLM stage produces
+# -----------------------------
+
+def segment_record(well, has_stimulation, complete, rng):
+    """complete: keep every field (the first form of a well has a full header)."""
+    township, range_ = well["township_range"].split(", ")
+    pick = lambda value: value if complete or rng.random() < 0.8 else None
+    api = well["api_number"]
+    return {
+        "api_number": pick(rng.choice([api, api.replace("-", ""), api.replace("-", " ")])),
+        "well_name": pick(well["well_name"]),
+        "operator": pick(rng.choice([well["operator"], well["operator"].title()])),
+        "county": pick(well["county"]),
+        "township": pick(rng.choice([township, township[:-1] + " N"])),
+        "range": pick(rng.choice([range_, range_[:-1] + " W"])),
+        "section": pick(str(rng.randint(1, 36))),
+        "latitude": pick(str(well["latitude"])),
+        "longitude": pick(str(well["longitude"])),
+        "stimulation_events": [dict(e) for e in well["stimulation_events"]] if has_stimulation else []
+    }
+
+
+# -----------------------------
+# Writing
+# -----------------------------
+
+def well_id(n):
+    return f"W{100000 + n}"
+
+
+def write_well(n, out, pages_per_well, seed):
+    rng = random.Random(seed + n)
+    well = synthetic_well(n, rng)
+    name = well_id(n)
+
+    pages, segments = build_pages(well, n, pages_per_well, rng)
+    text, spans = dump_pages(pages)
+    ocr_file = out / "ocr_json" / f"{name}.json"
+    ocr_file.write_text(text, encoding="utf-8")
+
+    compact = [{
+        "segment_id": i + 1,
+        "page_numbers": numbers,
+        "source": ocr_file.name,
+        "source_size": len(text),
+        "source_sha256": hashlib.sha256(text.encode()).hexdigest(),
+        "spans": [spans[p - 1] for p in numbers]
+    } for i, (numbers, _) in enumerate(segments)]
+    (out / "segments" / f"{name}_segments.json").write_text(json.dumps(compact, indent=2), encoding="utf-8")
+
+    structured = [{"segment_id": i + 1, "data": segment_record(well, has_stim, i == 0, rng)}
+                  for i, (_, has_stim) in enumerate(segments)]
+    (out / "structured" / f"{name}_structured.json").write_text(json.dumps(structured, indent=2),
+                                                                encoding="utf-8")
+    (out / "final_outputs" / f"{name}_structured.json").write_text(json.dumps(well, indent=2), encoding="utf-8")
+    return len(pages)
+
+
+def write_range(first, last, out, pages_per_well, seed):
+    return sum(write_well(n, out, pages_per_well, seed) for n in range(first, last))
+
+
+def generate(wells, out=OUT, pages_per_well=PAGES_PER_WELL, seed=0, workers=1):
+    out = Path(out)
+    for sub in ["ocr_json", "segments", "structured", "final_outputs"]:
+        (out / sub).mkdir(parents=True, exist_ok=True)
+
+    ranges = [(i, min(i + CHUNK_WELLS, wells)) for i in range(0, wells, CHUNK_WELLS)]
+    if workers == 1:
+        pages = sum(write_range(a, b, out, pages_per_well, seed) for a, b in ranges)
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(write_range, a, b, out, pages_per_well, seed) for a, b in ranges]
+            pages = sum(f.result() for f in futures)
+
+    (out / "corpus.json").write_text(json.dumps({
+        "wells": wells, "pages": pages, "pages_per_well": pages_per_well, "seed": seed
+    }, indent=2), encoding="utf-8")
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate a synthetic corpus shaped like data/")
+    parser.add_argument("--wells", type=int, default=10000)
+    parser.add_argument("--pages", type=int, default=PAGES_PER_WELL, help="form pages per well")
+    parser.add_argument("--out", type=Path, default=OUT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="processes, 0 = one per core")
+    args = parser.parse_args()
+
+    pages = generate(args.wells, args.out, args.pages, args.seed, args.workers)
+    print(f"wrote {args.wells} wells, {pages} pages to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
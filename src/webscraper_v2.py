@@ -1,5 +1,5 @@
 import time
-import mysql.connector
+import db
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -24,12 +24,7 @@ def setup_driver():
     return driver
 
 def create_new_fields():
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="devuser",
-        password="",
-        database="oil_wells_db"
-    )
+    connection = db.connect()
 
     cursor = connection.cursor()
 
@@ -56,12 +51,7 @@ def create_new_fields():
 
 
 def get_wells_from_db():
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="devuser",
-        password="",
-        database="oil_wells_db"
-    )
+    connection = db.connect()
     cursor = connection.cursor(dictionary=True)
     cursor.execute("SELECT api_number, well_name FROM wells;")
     wells = cursor.fetchall()
@@ -70,13 +60,7 @@ def get_wells_from_db():
     return wells
 
 
-def update_well_in_db(api_number, data):
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="devuser",
-        password="",
-        database="oil_wells_db"
-    )
+def update_well_in_db(connection, api_number, data):
     cursor = connection.cursor()
 
     cursor.execute("""
@@ -101,7 +85,6 @@ def update_well_in_db(api_number, data):
 
     connection.commit()
     cursor.close()
-    connection.close()
 
 
 def scrape_well_data(driver, api_number):
@@ -228,6 +211,8 @@ def scrape_well_data(driver, api_number):
 def main():
     driver = setup_driver()
     wells = get_wells_from_db()
+    # one connection for every update instead of a connect/teardown per well
+    connection = db.connect()
 
     for well in wells:
         print(f"Scraping: {well['api_number']}")
@@ -239,13 +224,14 @@ def main():
             )
 
             if scraped_data:
-                update_well_in_db(well["api_number"], scraped_data)
+                update_well_in_db(connection, well["api_number"], scraped_data)
 
         except Exception as e:
             print(f"Error scraping {well['api_number']}: {e}")
 
         time.sleep(2)  
 
+    connection.close()
     driver.quit()
     print("Scraping complete.")
 